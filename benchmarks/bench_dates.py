@@ -0,0 +1,54 @@
+# benchmarks/bench_dates.py
+"""
+Микро-бенчмарк разбора дат записей.
+Запуск из корня проекта: python -m benchmarks.bench_dates [число строк]
+"""
+
+import random
+import sys
+import timeit
+from datetime import datetime
+
+from utils import _MONTHS, format_russian_date, parse_many, parse_russian_datetime, to_starts_at
+
+
+def _legacy_parse(text: str) -> datetime:
+    # прежняя реализация parse_russian_datetime — для сравнения
+    parts = text.strip().split()
+    if len(parts) == 3:
+        day, month_str, time_str = parts
+        year = datetime.now().year
+    else:
+        day, month_str, year, time_str = parts
+    month = _MONTHS[month_str.lower()]
+    hour, minute = map(int, time_str.split(":"))
+    return datetime(int(year), month, int(day), hour, minute)
+
+
+def _rows(n: int) -> list[dict]:
+    rng = random.Random(0)
+    year = datetime.now().year
+    rows = []
+    for _ in range(n):
+        dt = datetime(year, rng.randint(1, 12), rng.randint(1, 28), rng.randint(12, 19))
+        rows.append({"date": format_russian_date(dt), "time": f"{dt:%H:%M}", "starts_at": to_starts_at(dt)})
+    return rows
+
+
+def main(n: int = 5000, repeat: int = 5):
+    rows = _rows(n)
+    legacy_rows = [{"date": r["date"], "time": r["time"]} for r in rows]
+    cases = {
+        "legacy parse per row": lambda: [_legacy_parse(f"{r['date']} {r['time']}") for r in rows],
+        "parse_russian_datetime per row": lambda: [parse_russian_datetime(f"{r['date']} {r['time']}") for r in rows],
+        "parse_many (date, time)": lambda: parse_many(legacy_rows),
+        "parse_many (starts_at)": lambda: parse_many(rows),
+    }
+    print(f"{n} строк, лучший из {repeat} прогонов:")
+    for name, fn in cases.items():
+        best = min(timeit.repeat(fn, number=1, repeat=repeat))
+        print(f"  {name:<32} {best * 1000:8.2f} мс  ({best / n * 1e6:.2f} мкс/строка)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
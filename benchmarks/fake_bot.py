@@ -0,0 +1,114 @@
+# benchmarks/fake_bot.py
+
+import asyncio
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, AsyncGenerator
+
+from aiogram import Bot
+from aiogram.client.session.base import BaseSession
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import GetMe, TelegramMethod
+from aiogram.types import Chat, Message, User
+
+FAKE_TOKEN = "123456789:AAFakeTokenForOfflineChecks_000000000"
+
+
+class FakeSession(BaseSession):
+    """
+    Сессия Bot API без сети: запоминает вызванные методы и отвечает
+    правдоподобными объектами. Соблюдение лимитов Telegram можно проверить:
+    при превышении global_limit сообщений в секунду на бота или
+    per_chat_limit в секунду на чат сессия бросает TelegramRetryAfter (429).
+    latency — искусственная задержка ответа в секундах.
+    """
+
+    def __init__(
+        self,
+        global_limit: int | None = 30,
+        per_chat_limit: int | None = 1,
+        retry_after: int = 1,
+        latency: float = 0.0,
+    ):
+        super().__init__()
+        self.global_limit = global_limit
+        self.per_chat_limit = per_chat_limit
+        self.retry_after = retry_after
+        self.latency = latency
+        self.requests: list[TelegramMethod] = []
+        self.flood_errors = 0
+        self._global_window: deque[float] = deque()
+        self._chat_windows: dict[Any, deque[float]] = defaultdict(deque)
+        self._message_id = 0
+
+    @property
+    def sent_messages(self) -> list[TelegramMethod]:
+        return [m for m in self.requests if getattr(m, "text", None) is not None]
+
+    def _over_limit(self, window: deque[float], limit: int | None, now: float) -> bool:
+        while window and now - window[0] >= 1.0:
+            window.popleft()
+        return limit is not None and len(window) >= limit
+
+    def _check_flood(self, method: TelegramMethod):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return
+        now = time.monotonic()
+        chat_window = self._chat_windows[chat_id]
+        if (self._over_limit(self._global_window, self.global_limit, now)
+                or self._over_limit(chat_window, self.per_chat_limit, now)):
+            self.flood_errors += 1
+            raise TelegramRetryAfter(
+                method=method,
+                message=f"Too Many Requests: retry after {self.retry_after}",
+                retry_after=self.retry_after,
+            )
+        self._global_window.append(now)
+        chat_window.append(now)
+
+    def _fake_result(self, bot: Bot, method: TelegramMethod) -> Any:
+        if isinstance(method, GetMe):
+            return User(id=bot.id, is_bot=True, first_name="FakeBot", username="fake_bot")
+        returning = getattr(method, "__returning__", None)
+        if returning is bool:
+            return True
+        if returning is Message or "Message" in str(returning):
+            self._message_id += 1
+            chat_id = getattr(method, "chat_id", 0)
+            return Message(
+                message_id=self._message_id,
+                date=datetime.now(),
+                chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+                text=getattr(method, "text", None),
+            )
+        return True
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: int | None = None) -> Any:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._check_flood(method)
+        self.requests.append(method)
+        return self._fake_result(bot, method)
+
+    async def stream_content(self, url: str, headers: dict[str, Any] | None = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self):
+        pass
+
+
+class FakeBot(Bot):
+    """
+    aiogram.Bot поверх FakeSession — для офлайн-проверок отправителя
+    и хэндлеров. Параметры передаются в FakeSession.
+    """
+
+    def __init__(self, **session_kwargs):
+        super().__init__(token=FAKE_TOKEN, session=FakeSession(**session_kwargs))
+
+    @property
+    def fake_session(self) -> FakeSession:
+        return self.session
@@ -0,0 +1,271 @@
+# benchmarks/load_test.py
+"""
+Нагрузочный тест: настоящий Dispatcher со всеми роутерами, FakeBot вместо
+Telegram и временная SQLite-БД. Синтетические апдейты сценариев
+(запись, «Мои записи», отмена, админские списки и подтверждение оплаты)
+подаются с заданной частотой; в конце несколько клиентов одновременно
+бронируют один и тот же слот — должна пройти ровно одна бронь.
+
+Запуск из корня проекта:
+    python -m benchmarks.load_test --rate 20 --duration 10 --contention 20
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+ADMINS = [1, 2, 3]
+
+# Окружение задаётся до импорта config: временная БД и свои админы
+_tmpdir = tempfile.TemporaryDirectory(prefix="massage-bot-load-")
+os.environ["DB_NAME"] = os.path.join(_tmpdir.name, "load.db")
+os.environ["MASSAGE_THERAPIST_ID"] = ",".join(map(str, ADMINS))
+
+from aiogram import Dispatcher  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+
+import notifications  # noqa: E402,F401  (подписывает пересчёт напоминаний на изменения записей)
+from config import DB_PATH  # noqa: E402
+from database.db import init_db  # noqa: E402
+from database.pool import open_pool, close_pool, get_pool  # noqa: E402
+from handlers.admin import router as admin_router  # noqa: E402
+from handlers.booking import router as booking_router  # noqa: E402
+from handlers.client import router as client_router  # noqa: E402
+from keyboards.calendar import CalendarCallback  # noqa: E402
+from services.availability import availability  # noqa: E402
+from services.catalog import get_catalog, reload_catalog  # noqa: E402
+from middlewares.concurrency import ChatIsolation, setup_concurrency  # noqa: E402
+from benchmarks.fake_bot import FakeBot  # noqa: E402
+from services.fsm_storage import SQLiteStorage  # noqa: E402
+from services.storage import (  # noqa: E402
+    load_availability, get_upcoming_user_appointments, get_unpaid_appointments,
+)
+from utils import record_button  # noqa: E402
+
+_ids = itertools.count(1)
+
+
+def _user(user_id: int) -> dict:
+    return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+
+def message_update(user_id: int, text: str) -> Update:
+    return Update.model_validate({
+        "update_id": next(_ids),
+        "message": {
+            "message_id": next(_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": _user(user_id),
+            "text": text,
+        },
+    })
+
+
+def callback_update(user_id: int, data: str) -> Update:
+    return Update.model_validate({
+        "update_id": next(_ids),
+        "callback_query": {
+            "id": str(next(_ids)),
+            "chat_instance": str(user_id),
+            "data": data,
+            "from": _user(user_id),
+            "message": {
+                "message_id": next(_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": "calendar",
+            },
+        },
+    })
+
+
+class LoadTest:
+    def __init__(self, dp: Dispatcher, bot: FakeBot):
+        self.dp = dp
+        self.bot = bot
+        self.update_latency: dict[str, list[float]] = defaultdict(list)
+        self.flow_latency: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.updates = 0
+        self._users = itertools.count(10_000)
+
+    async def feed(self, flow: str, update: Update):
+        start = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception:
+            self.errors[flow] += 1
+        finally:
+            self.update_latency[flow].append(time.perf_counter() - start)
+            self.updates += 1
+
+    # --- сценарии -------------------------------------------------------
+
+    async def open_calendar(self, flow: str, user_id: int):
+        await self.feed(flow, message_update(user_id, "📅 Записаться"))
+        await self.feed(flow, message_update(user_id, "Девушка"))
+        await self.feed(flow, message_update(user_id, get_catalog().for_audience("female")[0].title))
+
+    async def pick_slot(self, flow: str, user_id: int, slot: datetime):
+        day = dict(year=slot.year, month=slot.month, day=slot.day)
+        await self.feed(flow, callback_update(user_id, CalendarCallback(action="day", **day).pack()))
+        await self.feed(flow, callback_update(
+            user_id, CalendarCallback(action="time", minute=slot.hour * 60 + slot.minute, **day).pack()
+        ))
+        await self.feed(flow, callback_update(user_id, CalendarCallback(action="confirm").pack()))
+
+    async def booking(self, user_id: int):
+        await self.open_calendar("booking", user_id)
+        free = availability.next_free(50)
+        if free:
+            await self.pick_slot("booking", user_id, random.choice(free))
+
+    async def my_records(self, user_id: int):
+        await self.feed("my_records", message_update(user_id, "🗓 Мои записи"))
+
+    async def cancel(self, user_id: int):
+        await self.feed("cancel", message_update(user_id, "❌ Отменить запись"))
+        records = await get_upcoming_user_appointments(user_id, min_lead=timedelta(hours=24), limit=1)
+        if records:
+            await self.feed("cancel", message_update(user_id, record_button(records[0])))
+
+    async def admin_views(self, admin_id: int):
+        for text in ("📅 Сегодня", "🗓 Неделя", "🗓 Месяц"):
+            await self.feed("admin_views", message_update(admin_id, text))
+
+    async def admin_confirm(self, admin_id: int):
+        await self.feed("admin_confirm", message_update(admin_id, "✅ Подтвердить оплату"))
+        unpaid = await get_unpaid_appointments(1)
+        if unpaid:
+            r = unpaid[0]
+            await self.feed("admin_confirm", message_update(admin_id, record_button(r, f"u{r['user_id']}")))
+
+    async def run_flow(self, name: str):
+        # клиентские сценарии идут от «старых» клиентов, чтобы отмене было что отменять
+        if name.startswith("admin"):
+            actor = random.choice(ADMINS)
+        elif name == "booking":
+            actor = next(self._users)
+        else:
+            actor = random.randint(10_000, max(10_000, next(self._users) - 1))
+        start = time.perf_counter()
+        await getattr(self, name)(actor)
+        self.flow_latency[name].append(time.perf_counter() - start)
+
+    # --- нагрузка и проверка гонки --------------------------------------
+
+    async def generate(self, rate: float, duration: float, mix: dict[str, float]):
+        names, weights = zip(*mix.items())
+        tasks = []
+        started = time.perf_counter()
+        while time.perf_counter() - started < duration:
+            tasks.append(asyncio.create_task(self.run_flow(random.choices(names, weights)[0])))
+            # пуассоновский поток: экспоненциальные интервалы между сценариями
+            await asyncio.sleep(random.expovariate(rate))
+        await asyncio.gather(*tasks)
+
+    async def contention(self, clients: int) -> bool:
+        """
+        clients пользователей одновременно бронируют один свободный слот.
+        Возвращает True, если прошла ровно одна бронь.
+        """
+        slot = availability.next_free(1)
+        if not slot:
+            print("Нет свободных слотов для проверки гонки")
+            return False
+        slot = slot[0]
+        users = [next(self._users) for _ in range(clients)]
+        await asyncio.gather(*(self.open_calendar("contention", u) for u in users))
+        before = len(self.bot.fake_session.requests)
+        await asyncio.gather(*(self.pick_slot("contention", u, slot) for u in users))
+
+        accepted = sum(
+            1 for m in self.bot.fake_session.requests[before:]
+            if (getattr(m, "text", None) or "").startswith("✅ Ваша заявка принята")
+        )
+        async with get_pool().reader() as db:
+            async with db.execute(
+                "SELECT COUNT(*) FROM appointments WHERE starts_at = ? AND status != 'отменена'",
+                (slot.strftime("%Y-%m-%d %H:%M"),)
+            ) as cur:
+                (in_db,) = await cur.fetchone()
+        ok = accepted == 1 and in_db == 1
+        print(f"\nГонка за слот {slot:%Y-%m-%d %H:%M}: клиентов {clients}, "
+              f"подтверждено {accepted}, активных записей в БД {in_db} — {'OK' if ok else 'ОШИБКА'}")
+        return ok
+
+
+def _percentiles(values: list[float]) -> tuple[float, float, float]:
+    if len(values) < 2:
+        v = values[0] if values else 0.0
+        return v, v, v
+    q = statistics.quantiles(values, n=100, method="inclusive")
+    return q[49], q[94], q[98]
+
+
+def report(test: LoadTest, elapsed: float):
+    print(f"\nАпдейтов: {test.updates} за {elapsed:.1f} с — {test.updates / elapsed:.1f} апд/с")
+    print(f"Запросов к Bot API: {len(test.bot.fake_session.requests)}, ответов 429: "
+          f"{test.bot.fake_session.flood_errors}")
+    header = f"{'сценарий':<14}{'сценариев':>10}{'апдейтов':>10}{'ошибок':>8}" \
+             f"{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'сценарий p95, мс':>18}"
+    print(header)
+    for flow in sorted(test.update_latency):
+        p50, p95, p99 = _percentiles(test.update_latency[flow])
+        flow_p95 = _percentiles(test.flow_latency[flow])[1] if test.flow_latency[flow] else 0.0
+        print(f"{flow:<14}{len(test.flow_latency[flow]):>10}{len(test.update_latency[flow]):>10}"
+              f"{test.errors[flow]:>8}{p50 * 1000:>10.1f}{p95 * 1000:>10.1f}{p99 * 1000:>10.1f}"
+              f"{flow_p95 * 1000:>18.1f}")
+
+
+async def main(args) -> bool:
+    await init_db()
+    await open_pool()
+    await load_availability()
+    await reload_catalog()
+    storage = SQLiteStorage()
+    bot = FakeBot(global_limit=None, per_chat_limit=None, latency=args.api_latency)
+    dp = Dispatcher(storage=storage, events_isolation=ChatIsolation())
+    setup_concurrency(dp)
+    dp.include_router(admin_router)
+    dp.include_router(client_router)
+    dp.include_router(booking_router)
+
+    test = LoadTest(dp, bot)
+    mix = {"booking": 4, "my_records": 2, "cancel": 1, "admin_views": 1, "admin_confirm": 1}
+    print(f"БД: {DB_PATH}; {args.rate} сценариев/с в течение {args.duration} с; "
+          f"задержка Bot API {args.api_latency * 1000:.0f} мс")
+    try:
+        started = time.perf_counter()
+        await test.generate(args.rate, args.duration, mix)
+        report(test, time.perf_counter() - started)
+        return await test.contention(args.contention) if args.contention else True
+    finally:
+        await storage.close()
+        await close_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота на синтетических апдейтах")
+    parser.add_argument("--rate", type=float, default=20, help="сценариев в секунду")
+    parser.add_argument("--duration", type=float, default=10, help="длительность, с")
+    parser.add_argument("--contention", type=int, default=20,
+                        help="сколько клиентов одновременно бронируют один слот (0 — не проверять)")
+    parser.add_argument("--api-latency", type=float, default=0.02, help="задержка ответа Bot API, с")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    try:
+        ok = asyncio.run(main(args))
+    finally:
+        _tmpdir.cleanup()
+    sys.exit(0 if ok else 1)
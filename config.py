@@ -13,11 +13,33 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 # В .env у вас указано DB_NAME, поэтому берём его и называем DB_PATH
 DB_PATH = os.getenv("DB_NAME", "massage_bot.db")
 
+# Сколько соединений только на чтение держать в пуле
+DB_READERS = int(os.getenv("DB_READERS", "4"))
+
 # ID администраторов
 # В .env у вас указано MASSAGE_THERAPIST_ID — если вам нужно несколько админов,
 # можно указать через запятую, например "12345,67890"
 _admins = os.getenv("MASSAGE_THERAPIST_ID", "")
 ADMIN_IDS = [int(x) for x in _admins.split(",") if x.strip()]
 
+# Сколько часов хранить незавершённый диалог (FSM-состояние) без активности
+FSM_TTL_HOURS = float(os.getenv("FSM_TTL_HOURS", "24"))
+
+# Сколько апдейтов обрабатывается одновременно и сколько ещё может ждать очереди;
+# апдейты сверх очереди отбрасываются. Апдейты одного чата всегда идут по порядку.
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "32"))
+MAX_QUEUED_UPDATES = int(os.getenv("MAX_QUEUED_UPDATES", "256"))
+
+# На сколько минут выбранное при записи время закрепляется за клиентом до подтверждения
+SLOT_HOLD_MINUTES = float(os.getenv("SLOT_HOLD_MINUTES", "10"))
+
+# Режим webhook: если задан WEBHOOK_URL (публичный адрес сервиса, например
+# https://massage-bot.onrender.com), бот получает апдейты через тот же HTTP-сервер,
+# что и healthcheck. Без него используется поллинг.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+# Секрет для заголовка X-Telegram-Bot-Api-Secret-Token (A-Z, a-z, 0-9, _ и -)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+
 # (Опционально) Лог уровня, если нужно
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
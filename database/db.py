@@ -1,6 +1,17 @@
+import logging
+import re
+
 import aiosqlite
 from config import DB_PATH
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
+
+from services.schedule import Rule, parse_hhmm
+from utils import slot_datetime, to_starts_at, format_russian_date
+
+logger = logging.getLogger(__name__)
+
+# Длительность в названии услуги: "… — 40 мин — …"
+_DURATION_RE = re.compile(r"(\d+)\s*мин")
 
 async def init_db():
     async with aiosqlite.connect(DB_PATH) as db:
@@ -21,41 +32,343 @@ async def init_db():
             date TEXT,
             time TEXT,
             status TEXT,
-            payment_status TEXT
+            payment_status TEXT,
+            starts_at TEXT,
+            duration INTEGER NOT NULL DEFAULT 60,
+            ends_at TEXT
         )""")
+        await _migrate_appointments(db)
 
-        # Таблица расписания слотов
+        # Расписание: повторяющиеся правила (services.schedule.Rule)…
         await db.execute("""
-        CREATE TABLE IF NOT EXISTS schedule (
+        CREATE TABLE IF NOT EXISTS availability_rules (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            date TEXT,
-            time TEXT,
-            is_available INTEGER DEFAULT 1
+            weekdays INTEGER NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            step INTEGER NOT NULL DEFAULT 60,
+            date_from TEXT NOT NULL,
+            date_to TEXT,
+            is_open INTEGER NOT NULL DEFAULT 1
+        )""")
+        # …и разовые исключения: вручную добавленные/удалённые слоты
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS availability_exceptions (
+            day TEXT NOT NULL,
+            time TEXT NOT NULL,
+            is_available INTEGER NOT NULL,
+            PRIMARY KEY (day, time)
+        )""")
+
+        # Временные брони: выбранное при записи время держится за клиентом до held_until
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS slot_holds (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            starts_at TEXT NOT NULL,
+            duration INTEGER NOT NULL,
+            ends_at TEXT NOT NULL,
+            held_until TEXT NOT NULL
         )""")
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_slot_holds_starts ON slot_holds (starts_at)"
+        )
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_slot_holds_user ON slot_holds (user_id)"
+        )
 
-        # Таблица уведомлений
+        # Таблица уведомлений: одна строка на одно напоминание одному получателю
         await db.execute("""
         CREATE TABLE IF NOT EXISTS notifications (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             appointment_id INTEGER,
-            type TEXT
-        )""")
-
-        # Наполнение schedule: только вторник, четверг, суббота с 12:00 до 19:00
-        today = date.today()
-        end_of_year = date(today.year, 12, 31)
-        current = today
-        # weekday(): Monday=0, Tuesday=1, Thursday=3, Saturday=5
-        allowed_weekdays = {1, 3, 5}
-        while current <= end_of_year:
-            if current.weekday() in allowed_weekdays:
-                d_str = current.strftime("%d %B")
-                for hour in range(12, 20):  # 12..19 включительно
-                    time_str = f"{hour:02d}:00"
-                    await db.execute(
-                        "INSERT OR IGNORE INTO schedule (date, time) VALUES (?, ?)",
-                        (d_str, time_str)
-                    )
-            current += timedelta(days=1)
+            type TEXT,
+            chat_id INTEGER,
+            due_at TEXT,
+            sent_at TEXT,
+            claimed_at TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            not_before TEXT
+        )""")
+        await _migrate_notifications(db)
+
+        # Каталог услуг (читается в память модулем services.catalog)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS services (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            duration INTEGER NOT NULL DEFAULT 60,
+            price INTEGER NOT NULL DEFAULT 0,
+            audience TEXT NOT NULL DEFAULT 'all',
+            position INTEGER NOT NULL DEFAULT 0,
+            is_active INTEGER NOT NULL DEFAULT 1
+        )""")
+        await _migrate_services(db)
+
+        # Служебные значения (например, выполненные миграции)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )""")
+
+        # Состояния диалогов (FSM aiogram)
+        await db.execute("""
+        CREATE TABLE IF NOT EXISTS fsm_state (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT NOT NULL DEFAULT '{}',
+            updated_at REAL NOT NULL
+        )""")
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_fsm_state_updated ON fsm_state (updated_at)"
+        )
+
+        # Задачи APScheduler раньше хранились в этой же БД; теперь планировщик
+        # держит их в памяти, а напоминания лежат в notifications
+        await db.execute("DROP TABLE IF EXISTS apscheduler_jobs")
+
+        await _migrate_date_format(db)
+        await _migrate_schedule_rules(db)
 
         await db.commit()
+
+async def _backfill_durations(db: aiosqlite.Connection):
+    """
+    Старые записи хранили длительность только в тексте услуги
+    ("Классический массаж — 60 мин — 2 500₽"): переносим её в duration
+    и считаем ends_at для всех записей, где его ещё нет.
+    """
+    async with db.execute(
+        "SELECT id, service FROM appointments WHERE ends_at IS NULL AND starts_at IS NOT NULL"
+    ) as cur:
+        rows = await cur.fetchall()
+    durations = [
+        (int(match.group(1)), appt_id)
+        for appt_id, service in rows
+        if (match := _DURATION_RE.search(service or ""))
+    ]
+    if durations:
+        await db.executemany("UPDATE appointments SET duration = ? WHERE id = ?", durations)
+    await db.execute(
+        """
+        UPDATE appointments
+        SET ends_at = strftime('%Y-%m-%d %H:%M', starts_at, '+' || duration || ' minutes')
+        WHERE ends_at IS NULL AND starts_at IS NOT NULL
+        """
+    )
+
+async def _migrate_notifications(db: aiosqlite.Connection):
+    """
+    Добавляет в notifications колонки получателя, времени отправки, отметки
+    об отправке, аренды отправки (claimed_at, attempts) и отложенного повтора
+    (not_before), а также индекс по неотправленным напоминаниям.
+    """
+    async with db.execute("PRAGMA table_info(notifications)") as cur:
+        columns = {row[1] for row in await cur.fetchall()}
+    for column, sql_type in (
+        ("chat_id", "INTEGER"), ("due_at", "TEXT"), ("sent_at", "TEXT"),
+        ("claimed_at", "TEXT"), ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+        ("not_before", "TEXT"),
+    ):
+        if column not in columns:
+            await db.execute(f"ALTER TABLE notifications ADD COLUMN {column} {sql_type}")
+
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_notifications_pending "
+        "ON notifications (due_at) WHERE sent_at IS NULL"
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_notifications_appointment "
+        "ON notifications (appointment_id)"
+    )
+
+# Услуги по умолчанию: (name, duration, price, audience)
+# audience: 'female' — для девушек, 'male' — для мужчин, 'all' — для всех
+_DEFAULT_SERVICES = [
+    ("Классический массаж", 60, 2500, "all"),
+    ("Массаж спины + (зона ШВЗ)", 40, 2000, "female"),
+    ("Массаж спины + (зона ШВЗ)", 40, 2500, "male"),
+    ("Антицеллюлитный массаж", 60, 2000, "female"),
+]
+
+async def _migrate_services(db: aiosqlite.Connection):
+    """
+    Доводит старую таблицу services (id, name, description, price) до текущей схемы
+    и заполняет пустой каталог услугами, которые раньше были зашиты в хэндлеры.
+    """
+    async with db.execute("PRAGMA table_info(services)") as cur:
+        columns = {row[1] for row in await cur.fetchall()}
+    for column, ddl in (
+        ("description", "TEXT"),
+        ("duration", "INTEGER NOT NULL DEFAULT 60"),
+        ("price", "INTEGER NOT NULL DEFAULT 0"),
+        ("audience", "TEXT NOT NULL DEFAULT 'all'"),
+        ("position", "INTEGER NOT NULL DEFAULT 0"),
+        ("is_active", "INTEGER NOT NULL DEFAULT 1"),
+    ):
+        if column not in columns:
+            await db.execute(f"ALTER TABLE services ADD COLUMN {column} {ddl}")
+
+    async with db.execute("SELECT 1 FROM services LIMIT 1") as cur:
+        if await cur.fetchone() is not None:
+            return
+    await db.executemany(
+        "INSERT INTO services (name, duration, price, audience, position) VALUES (?, ?, ?, ?, ?)",
+        [(*service, position) for position, service in enumerate(_DEFAULT_SERVICES)]
+    )
+
+async def _migrate_date_format(db: aiosqlite.Connection):
+    """
+    Переводит даты в schedule и appointments из strftime('%d %B')
+    (зависел от локали процесса) в format_russian_date: "5 мая".
+    Выполняется один раз (meta.date_format = 'ru').
+    """
+    async with db.execute("SELECT value FROM meta WHERE key = 'date_format'") as cur:
+        row = await cur.fetchone()
+    if row is not None and row[0] == "ru":
+        return
+
+    for table in ("schedule", "appointments"):
+        if not await _table_exists(db, table):
+            continue
+        async with db.execute(f"SELECT DISTINCT date FROM {table}") as cur:
+            old_dates = [r[0] for r in await cur.fetchall()]
+        renames = []
+        for old in old_dates:
+            try:
+                new = format_russian_date(slot_datetime(old, "00:00"))
+            except (ValueError, AttributeError):
+                logger.warning(f"Не удалось разобрать дату в {table}: {old!r}")
+                continue
+            if new != old:
+                renames.append((new, old))
+        # совпавшие после переименования слоты schedule схлопывает _migrate_schedule_rules
+        await db.executemany(f"UPDATE {table} SET date = ? WHERE date = ?", renames)
+
+    await db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('date_format', 'ru')")
+
+# Расписание по умолчанию: вторник, четверг, суббота, слоты с 12:00 до 19:00 (последний)
+_DEFAULT_WEEKDAYS = (1 << 1) | (1 << 3) | (1 << 5)   # weekday(): Monday=0
+_DEFAULT_HOURS = ("12:00", "20:00")
+
+async def _table_exists(db: aiosqlite.Connection, name: str) -> bool:
+    async with db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ) as cur:
+        return await cur.fetchone() is not None
+
+async def _migrate_schedule_rules(db: aiosqlite.Connection):
+    """
+    Заводит правило расписания по умолчанию в пустой availability_rules.
+    Старая таблица schedule (строка на каждый слот до конца года, нередко
+    с дубликатами) сворачивается в это правило плюс исключения — слоты,
+    которые админ добавил или удалил вручную, — и удаляется.
+    """
+    async with db.execute("SELECT 1 FROM availability_rules LIMIT 1") as cur:
+        if await cur.fetchone() is not None:
+            return
+    today = date.today()
+    cursor = await db.execute(
+        "INSERT INTO availability_rules (weekdays, start_time, end_time, step, date_from) "
+        "VALUES (?, ?, ?, 60, ?)",
+        (_DEFAULT_WEEKDAYS, *_DEFAULT_HOURS, today.isoformat())
+    )
+    if not await _table_exists(db, "schedule"):
+        return
+
+    rule = Rule(
+        cursor.lastrowid, _DEFAULT_WEEKDAYS, parse_hhmm(_DEFAULT_HOURS[0]),
+        parse_hhmm(_DEFAULT_HOURS[1]), 60, today
+    )
+    async with db.execute("SELECT date, time FROM schedule") as cur:
+        rows = await cur.fetchall()
+    # дубликаты строк (в том числе после смены формата дат) схлопываются во множестве
+    materialized = set()
+    for d_str, t_str in rows:
+        try:
+            dt = slot_datetime(d_str, t_str)
+        except ValueError:
+            logger.warning(f"Не удалось разобрать слот расписания: {d_str!r} {t_str!r}")
+            continue
+        if dt.date() >= today:
+            materialized.add(dt)
+
+    # до горизонта старой генерации отсутствие слота правила — удаление вручную
+    async with db.execute("SELECT value FROM meta WHERE key = 'schedule_horizon'") as cur:
+        row = await cur.fetchone()
+    horizon = date.fromisoformat(row[0]) if row else max((dt.date() for dt in materialized), default=today)
+    exceptions = [(dt, True) for dt in materialized if not rule.produces(dt)]
+    day = today
+    while day <= horizon:
+        if rule.covers(day):
+            for m in range(rule.start, rule.end, rule.step):
+                dt = datetime.combine(day, datetime.min.time()) + timedelta(minutes=m)
+                if dt not in materialized:
+                    exceptions.append((dt, False))
+        day += timedelta(days=1)
+
+    await db.executemany(
+        "INSERT OR REPLACE INTO availability_exceptions (day, time, is_available) VALUES (?, ?, ?)",
+        [(dt.date().isoformat(), dt.strftime("%H:%M"), int(available)) for dt, available in exceptions]
+    )
+    await db.execute("DROP TABLE schedule")
+    await db.execute("DELETE FROM meta WHERE key = 'schedule_horizon'")
+    logger.info(f"Расписание переведено на правила: {len(rows)} слотов -> 1 правило и {len(exceptions)} исключений")
+
+async def _migrate_appointments(db: aiosqlite.Connection):
+    """
+    Добавляет колонку starts_at ('YYYY-MM-DD HH:MM') в старые базы,
+    заполняет её по date/time и создаёт индексы для выборок по времени.
+    """
+    async with db.execute("PRAGMA table_info(appointments)") as cur:
+        columns = {row[1] for row in await cur.fetchall()}
+    if "starts_at" not in columns:
+        await db.execute("ALTER TABLE appointments ADD COLUMN starts_at TEXT")
+    if "duration" not in columns:
+        await db.execute("ALTER TABLE appointments ADD COLUMN duration INTEGER NOT NULL DEFAULT 60")
+    if "ends_at" not in columns:
+        await db.execute("ALTER TABLE appointments ADD COLUMN ends_at TEXT")
+
+    async with db.execute(
+        "SELECT id, date, time FROM appointments WHERE starts_at IS NULL"
+    ) as cur:
+        rows = await cur.fetchall()
+    backfill = []
+    for appt_id, d_str, t_str in rows:
+        try:
+            backfill.append((to_starts_at(slot_datetime(d_str, t_str)), appt_id))
+        except ValueError:
+            logger.warning(f"Не удалось разобрать дату записи id={appt_id}: {d_str!r} {t_str!r}")
+    if backfill:
+        await db.executemany("UPDATE appointments SET starts_at = ? WHERE id = ?", backfill)
+    await _backfill_durations(db)
+
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_appointments_starts_status "
+        "ON appointments (starts_at, status)"
+    )
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_appointments_user_starts "
+        "ON appointments (user_id, starts_at)"
+    )
+    # Очередь на подтверждение оплаты: только неоплаченные активные записи
+    await db.execute(
+        "CREATE INDEX IF NOT EXISTS idx_appointments_unpaid "
+        "ON appointments (id) WHERE payment_status = 'не оплачено' AND status != 'отменена'"
+    )
+    # Один активный сеанс на слот. Если в старой базе уже есть дубликаты,
+    # уникальный индекс не создать — оставляем обычный и предупреждаем.
+    try:
+        await db.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ux_appointments_active_slot "
+            "ON appointments (starts_at) WHERE status != 'отменена'"
+        )
+        await db.execute("DROP INDEX IF EXISTS idx_appointments_active")
+    except aiosqlite.IntegrityError:
+        logger.warning("В appointments есть пересекающиеся активные записи, уникальный индекс слота не создан")
+        await db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_appointments_active "
+            "ON appointments (starts_at) WHERE status != 'отменена'"
+        )
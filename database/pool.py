@@ -0,0 +1,124 @@
+# database/pool.py
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+import aiosqlite
+
+from config import DB_PATH, DB_READERS
+
+# Прагмы для каждого соединения. WAL даёт читателям не ждать писателя,
+# synchronous=NORMAL в режиме WAL безопасен и заметно быстрее FULL.
+_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -8000",   # ~8 МБ страничного кэша
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+class ConnectionPool:
+    """
+    Долгоживущие соединения с SQLite:
+      – одно соединение на запись (операции сериализуются asyncio.Lock);
+      – несколько соединений только на чтение, выдаются из очереди.
+    В режиме WAL читатели видят последний закоммиченный снимок
+    и никогда не ждут писателя.
+    """
+
+    def __init__(self, path: str = DB_PATH, readers: int = DB_READERS):
+        self.path = path
+        self.readers_count = max(1, readers)
+        self._writer: aiosqlite.Connection | None = None
+        self._write_lock = asyncio.Lock()
+        self._readers: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        self._all_readers: list[aiosqlite.Connection] = []
+
+    async def _connect(self, read_only: bool) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.path)
+        conn.row_factory = aiosqlite.Row
+        for pragma in _PRAGMAS:
+            await self._pragma(conn, pragma)
+        if read_only:
+            await self._pragma(conn, "PRAGMA query_only = 1")
+        return conn
+
+    @staticmethod
+    async def _pragma(conn: aiosqlite.Connection, pragma: str):
+        # Курсор нужно закрыть сразу: незавершённый PRAGMA держит блокировку файла
+        async with conn.execute(pragma):
+            pass
+
+    async def open(self):
+        self._writer = await self._connect(read_only=False)
+        # journal_mode хранится в самом файле БД, достаточно выставить один раз
+        await self._pragma(self._writer, "PRAGMA journal_mode = WAL")
+        for _ in range(self.readers_count):
+            conn = await self._connect(read_only=True)
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+
+    async def close(self):
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers.clear()
+        self._readers = asyncio.Queue()
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Выдаёт свободное соединение для чтения и возвращает его в пул.
+        """
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Эксклюзивный доступ к соединению на запись.
+        Коммит при успешном выходе, откат при исключении.
+        """
+        if self._writer is None:
+            raise RuntimeError("Пул соединений не открыт")
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            else:
+                await self._writer.commit()
+
+
+_pool: ConnectionPool | None = None
+
+
+async def open_pool(path: str = DB_PATH, readers: int = DB_READERS) -> ConnectionPool:
+    """
+    Создаёт и открывает общий пул. Вызывается из main.main() после init_db().
+    """
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool(path, readers)
+        await _pool.open()
+    return _pool
+
+
+def get_pool() -> ConnectionPool:
+    if _pool is None:
+        raise RuntimeError("Пул соединений не открыт: вызовите open_pool()")
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
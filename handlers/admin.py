@@ -1,20 +1,31 @@
 # handlers/admin.py
 
 import re
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 from aiogram import Router, F
+from aiogram.filters.callback_data import CallbackData
 from aiogram.filters.command import Command
-from aiogram.types import Message, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from aiogram.types import (
+    Message, CallbackQuery, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove,
+    InlineKeyboardMarkup, InlineKeyboardButton,
+)
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from config import ADMIN_IDS
 from services.storage import (
-    get_all_appointments, confirm_payment,
-    get_appointments_by_range, add_schedule_slot, remove_schedule_slot
+    get_unpaid_appointments, confirm_by_id,
+    iter_appointments_by_range, add_schedule_slot, remove_schedule_slot,
+    add_schedule_rule, set_service_price,
+)
+from services.paginator import take_page
+from services.schedule import ALL_WEEKDAYS, parse_hhmm
+from services.catalog import get_catalog, reload_catalog
+from utils import (
+    parse_russian_datetime, format_russian_date, to_starts_at,
+    record_button, record_id_from_button,
 )
-from utils import parse_russian_datetime
 from keyboards.client_kb import admin_menu
 
 router = Router()
@@ -63,44 +74,59 @@ async def admin_go_back(message: Message, state: FSMContext):
 
 
 # Confirm payment
+CONFIRM_PAGE_SIZE = 10
+MORE_BUTTON = "➡️ Ещё записи"
+
+async def _send_unpaid_page(message: Message, state: FSMContext, cursor: int = 0) -> bool:
+    """
+    Показывает кнопками страницу неоплаченных записей с ID больше cursor.
+    В FSM хранятся только ID показанных записей и ключ следующей страницы.
+    Возвращает False, если записей нет.
+    """
+    unpaid = await get_unpaid_appointments(CONFIRM_PAGE_SIZE + 1, cursor)
+    has_more = len(unpaid) > CONFIRM_PAGE_SIZE
+    unpaid = unpaid[:CONFIRM_PAGE_SIZE]
+    if not unpaid:
+        return False
+
+    await state.update_data(
+        record_ids=[r["id"] for r in unpaid],
+        cursor=unpaid[-1]["id"] if has_more else None,
+    )
+    keyboard = [[KeyboardButton(text=record_button(r, f"u{r['user_id']}"))] for r in unpaid]
+    if has_more:
+        keyboard.append([KeyboardButton(text=MORE_BUTTON)])
+    keyboard.append([KeyboardButton(text="⬅️ Назад")])
+    kb = ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
+    await message.answer("Выберите запись для подтверждения оплаты:", reply_markup=kb)
+    return True
+
 @router.message(F.text == "✅ Подтвердить оплату")
 async def cmd_confirm(message: Message, state: FSMContext):
     await state.clear()
     if not is_admin(message.from_user.id):
         return
 
-    recs = await get_all_appointments()
-    unpaid = [r for r in recs if r["payment_status"] == "не оплачено"]
-    if not unpaid:
+    if not await _send_unpaid_page(message, state):
         return await message.answer("Нет неоплаченных записей.", reply_markup=admin_menu())
-
     await state.set_state(AdminStates.confirming)
-    await state.update_data(records=unpaid)
-
-    keyboard = [
-        *[[KeyboardButton(text=f"{r['user_id']}|{r['date']} {r['time']}")] for r in unpaid],
-        [KeyboardButton(text="⬅️ Назад")]
-    ]
-    kb = ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True)
-    await message.answer("Выберите запись для подтверждения оплаты:", reply_markup=kb)
 
 @router.message(AdminStates.confirming)
 async def on_confirm(message: Message, state: FSMContext):
     if message.text == "⬅️ Назад":
         return await admin_go_back(message, state)
-    try:
-        uid_s, rest = message.text.split("|", 1)
-        uid = int(uid_s)
-        date, time = rest.split()
-    except ValueError:
-        return await message.answer("❌ Формат: user_id|DD МММ HH:MM")
+    data = await state.get_data()
+    if message.text == MORE_BUTTON:
+        if not data.get("cursor") or not await _send_unpaid_page(message, state, data["cursor"]):
+            await message.answer("Больше записей нет.")
+        return
 
-    recs = (await state.get_data())["records"]
-    match = next((r for r in recs if r["user_id"] == uid and r["date"] == date and r["time"] == time), None)
-    if not match:
+    appt_id = record_id_from_button(message.text)
+    if appt_id is None:
+        return await message.answer("❌ Выберите запись кнопкой.")
+    if appt_id not in data["record_ids"] or not (await confirm_by_id(appt_id)).ok:
         return await message.answer("Запись не найдена.")
 
-    await confirm_payment(uid, date, time)
     await state.clear()
     await message.answer("✅ Оплата подтверждена.", reply_markup=admin_menu())
 
@@ -143,20 +169,41 @@ async def on_enter_slot(message: Message, state: FSMContext):
     except ValueError:
         return await message.answer("❌ Пример: 31 мая 14:00")
 
-    d_str = dt.strftime("%d %B")
+    d_str = format_russian_date(dt)
     t_str = dt.strftime("%H:%M")
     action = (await state.get_data())["action"]
     if action == "➕ Добавить":
-        await add_schedule_slot(d_str, t_str)
+        await add_schedule_slot(dt)
         resp = f"✅ Слот добавлен: {d_str} {t_str}"
     else:
-        await remove_schedule_slot(d_str, t_str)
+        await remove_schedule_slot(dt)
         resp = f"✅ Слот удалён: {d_str} {t_str}"
 
     await state.clear()
     await message.answer(resp, reply_markup=admin_menu())
 
 
+async def _apply_rule(
+    message: Message, state: FSMContext, start: date, end: date,
+    time_from: str, time_to: str, is_open: bool, label: str
+):
+    """
+    Открывает или закрывает часовые слоты с time_from до time_to на каждый день
+    от start до end — одним правилом расписания.
+    """
+    if not 0 <= parse_hhmm(time_from) < parse_hhmm(time_to) <= 24 * 60:
+        return await message.answer("❌ Неверное время. Пример: 12:00—19:00")
+    changes = await add_schedule_rule(ALL_WEEKDAYS, time_from, time_to, start, end, is_open=is_open)
+    await state.clear()
+    verb = "открыты" if is_open else "закрыты"
+    await message.answer(
+        f"✅ Расписание на {label} {format_russian_date(start)}–{format_russian_date(end)}: "
+        f"слоты с {time_from} до {time_to} {verb}. "
+        f"Изменено слотов: {sum(changes.values())}, дней: {len(changes)}.",
+        reply_markup=admin_menu()
+    )
+
+
 # Bulk range edit
 @router.message(F.text == "🔄 Групповое редактирование")
 async def cmd_bulk(message: Message, state: FSMContext):
@@ -197,29 +244,11 @@ async def on_bulk_enter(message: Message, state: FSMContext):
     d1_s, d2_s, t1_s, t2_s = m.groups()
     d1 = parse_russian_datetime(f"{d1_s} 00:00")
     d2 = parse_russian_datetime(f"{d2_s} 00:00")
-    t1_h, t1_m = map(int, t1_s.split(":"))
-    t2_h, t2_m = map(int, t2_s.split(":"))
     if d2 < d1:
         return await message.answer("❌ Вторая дата раньше первой.")
 
     action = (await state.get_data())["bulk_action"]
-    cnt, cur = 0, d1
-    while cur.date() <= d2.date():
-        h = t1_h
-        while (h < t2_h) or (h == t2_h and t1_m < t2_m):
-            ds = cur.strftime("%d %B")
-            ts = f"{h:02d}:{t1_m:02d}"
-            if action.startswith("➕"):
-                await add_schedule_slot(ds, ts)
-            else:
-                await remove_schedule_slot(ds, ts)
-            cnt += 1
-            h += 1
-        cur += timedelta(days=1)
-
-    verb = "добавлено" if action.startswith("➕") else "удалено"
-    await state.clear()
-    await message.answer(f"✅ Диапазон обработан: {cnt} слотов {verb}.", reply_markup=admin_menu())
+    await _apply_rule(message, state, d1.date(), d2.date(), t1_s, t2_s, action.startswith("➕"), "период")
 
 
 # Week add
@@ -245,24 +274,8 @@ async def on_week_add(message: Message, state: FSMContext):
         return await message.answer("❌ Формат: `DD MMM HH:MM—HH:MM`")
     d1_s, t1_s, t2_s = m.groups()
     d1 = parse_russian_datetime(f"{d1_s} 00:00")
-    t1_h, t1_m = map(int, t1_s.split(":"))
-    t2_h, t2_m = map(int, t2_s.split(":"))
-    start, end = d1.date(), d1.date() + timedelta(days=6)
-    cnt, cur = 0, d1
-    while cur.date() <= end:
-        h = t1_h
-        while (h < t2_h) or (h == t2_h and t1_m < t2_m):
-            ds = cur.strftime("%d %B")
-            ts = f"{h:02d}:{t1_m:02d}"
-            await add_schedule_slot(ds, ts)
-            cnt += 1
-            h += 1
-        cur += timedelta(days=1)
-    await state.clear()
-    await message.answer(
-        f"✅ Добавлено {cnt} слотов на неделю {start.strftime('%d %B')}–{end.strftime('%d %B')}.",
-        reply_markup=admin_menu()
-    )
+    start = d1.date()
+    await _apply_rule(message, state, start, start + timedelta(days=6), t1_s, t2_s, True, "неделю")
 
 
 # Week remove
@@ -288,24 +301,8 @@ async def on_week_remove(message: Message, state: FSMContext):
         return await message.answer("❌ Формат: `DD MMM HH:MM—HH:MM`")
     d1_s, t1_s, t2_s = m.groups()
     d1 = parse_russian_datetime(f"{d1_s} 00:00")
-    t1_h, t1_m = map(int, t1_s.split(":"))
-    t2_h, t2_m = map(int, t2_s.split(":"))
-    start, end = d1.date(), d1.date() + timedelta(days=6)
-    cnt, cur = 0, d1
-    while cur.date() <= end:
-        h = t1_h
-        while (h < t2_h) or (h == t2_h and t1_m < t2_m):
-            ds = cur.strftime("%d %B")
-            ts = f"{h:02d}:{t1_m:02d}"
-            await remove_schedule_slot(ds, ts)
-            cnt += 1
-            h += 1
-        cur += timedelta(days=1)
-    await state.clear()
-    await message.answer(
-        f"✅ Удалено {cnt} слотов на неделю {start.strftime('%d %B')}–{end.strftime('%d %B')}.",
-        reply_markup=admin_menu()
-    )
+    start = d1.date()
+    await _apply_rule(message, state, start, start + timedelta(days=6), t1_s, t2_s, False, "неделю")
 
 
 # Month add
@@ -331,24 +328,8 @@ async def on_month_add(message: Message, state: FSMContext):
         return await message.answer("❌ Формат: `DD MMM HH:MM—HH:MM`")
     d1_s, t1_s, t2_s = m.groups()
     d1 = parse_russian_datetime(f"{d1_s} 00:00")
-    t1_h, t1_m = map(int, t1_s.split(":"))
-    t2_h, t2_m = map(int, t2_s.split(":"))
-    start, end = d1.date(), d1.date() + timedelta(days=29)
-    cnt, cur = 0, d1
-    while cur.date() <= end:
-        h = t1_h
-        while (h < t2_h) or (h == t2_h and t1_m < t2_m):
-            ds = cur.strftime("%d %B")
-            ts = f"{h:02d}:{t1_m:02d}"
-            await add_schedule_slot(ds, ts)
-            cnt += 1
-            h += 1
-        cur += timedelta(days=1)
-    await state.clear()
-    await message.answer(
-        f"✅ Добавлено {cnt} слотов на месяц {start.strftime('%d %B')}–{end.strftime('%d %B')}.",
-        reply_markup=admin_menu()
-    )
+    start = d1.date()
+    await _apply_rule(message, state, start, start + timedelta(days=29), t1_s, t2_s, True, "месяц")
 
 
 # Month remove
@@ -374,36 +355,62 @@ async def on_month_remove(message: Message, state: FSMContext):
         return await message.answer("❌ Формат: `DD MMM HH:MM—HH:MM`")
     d1_s, t1_s, t2_s = m.groups()
     d1 = parse_russian_datetime(f"{d1_s} 00:00")
-    t1_h, t1_m = map(int, t1_s.split(":"))
-    t2_h, t2_m = map(int, t2_s.split(":"))
-    start, end = d1.date(), d1.date() + timedelta(days=29)
-    cnt, cur = 0, d1
-    while cur.date() <= end:
-        h = t1_h
-        while (h < t2_h) or (h == t2_h and t1_m < t2_m):
-            ds = cur.strftime("%d %B")
-            ts = f"{h:02d}:{t1_m:02d}"
-            await remove_schedule_slot(ds, ts)
-            cnt += 1
-            h += 1
-        cur += timedelta(days=1)
-    await state.clear()
-    await message.answer(
-        f"✅ Удалено {cnt} слотов на месяц {start.strftime('%d %B')}–{end.strftime('%d %B')}.",
-        reply_markup=admin_menu()
-    )
+    start = d1.date()
+    await _apply_rule(message, state, start, start + timedelta(days=29), t1_s, t2_s, False, "месяц")
 
 
 # View appointments
+_VIEW_TITLES = {"today": "📅 Сегодня", "week": "🗓 Неделя", "month": "🗓 Месяц"}
+
+class AppointmentsPage(CallbackData, prefix="apg"):
+    """
+    Кнопка «следующая страница» списка записей: вид, диапазон дат (YYYYMMDD)
+    и ключ (starts_at в виде YYYYMMDDHHMM, id) последней показанной записи.
+    """
+    view: str
+    start: str
+    end: str
+    after_at: str
+    after_id: int
+
+def _format_appointment(r: dict) -> str:
+    return f"{r['date']} {r['time']} — {r['service']} (u{r['user_id']})"
+
+async def _send_appointments_page(
+    message: Message, view: str, start: date, end: date, after: tuple[str, int] | None = None
+):
+    """
+    Отправляет одну страницу записей за [start, end], начиная после ключа after.
+    Записи читаются потоком, страница ограничена размером сообщения Telegram.
+    """
+    title = _VIEW_TITLES[view]
+    if view != "today":
+        title += f" ({format_russian_date(start)}–{format_russian_date(end)})"
+    header = f"{title}:" if after is None else f"{title}, продолжение:"
+
+    text, last = await take_page(iter_appointments_by_range(start, end, after), _format_appointment, header)
+    if last is None and after is None and text == header:
+        text += "\nПусто"
+
+    if last is not None:
+        markup = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(
+            text="Дальше ➡️",
+            callback_data=AppointmentsPage(
+                view=view, start=f"{start:%Y%m%d}", end=f"{end:%Y%m%d}",
+                after_at=re.sub(r"\D", "", last["starts_at"]), after_id=last["id"],
+            ).pack(),
+        )]])
+    else:
+        markup = admin_menu() if after is None else None
+    await message.answer(text, reply_markup=markup)
+
 @router.message(F.text == "📅 Сегодня")
 async def view_today(message: Message, state: FSMContext):
     await state.clear()
     if not is_admin(message.from_user.id):
         return
-    today = datetime.now().date().strftime("%d %B")
-    recs = await get_appointments_by_range(today, today)
-    text = "\n".join(f"{r['date']} {r['time']} — {r['service']} (u{r['user_id']})" for r in recs) or "Пусто"
-    await message.answer(f"📅 Сегодня:\n{text}", reply_markup=admin_menu())
+    today = datetime.now().date()
+    await _send_appointments_page(message, "today", today, today)
 
 @router.message(F.text == "🗓 Неделя")
 async def view_week(message: Message, state: FSMContext):
@@ -411,11 +418,7 @@ async def view_week(message: Message, state: FSMContext):
     if not is_admin(message.from_user.id):
         return
     start = datetime.now().date()
-    end   = start + timedelta(days=7)
-    sd, ed = start.strftime("%d %B"), end.strftime("%d %B")
-    recs = await get_appointments_by_range(sd, ed)
-    text = "\n".join(f"{r['date']} {r['time']} — {r['service']} (u{r['user_id']})" for r in recs) or "Пусто"
-    await message.answer(f"🗓 Неделя ({sd}–{ed}):\n{text}", reply_markup=admin_menu())
+    await _send_appointments_page(message, "week", start, start + timedelta(days=7))
 
 @router.message(F.text == "🗓 Месяц")
 async def view_month(message: Message, state: FSMContext):
@@ -423,9 +426,45 @@ async def view_month(message: Message, state: FSMContext):
     if not is_admin(message.from_user.id):
         return
     start = datetime.now().date()
-    end   = start + timedelta(days=30)
-    sd, ed = start.strftime("%d %B"), end.strftime("%d %B")
-    recs = await get_appointments_by_range(sd, ed)
-    text = "\n".join(f"{r['date']} {r['time']} — {r['service']} (u{r['user_id']})" for r in recs) or "Пусто"
-    await message.answer(f"🗓 Месяц ({sd}–{ed}):\n{text}", reply_markup=admin_menu())
+    await _send_appointments_page(message, "month", start, start + timedelta(days=30))
+
+@router.callback_query(AppointmentsPage.filter())
+async def view_next_page(call: CallbackQuery, callback_data: AppointmentsPage):
+    if not is_admin(call.from_user.id):
+        return await call.answer()
+    after_at = datetime.strptime(callback_data.after_at, "%Y%m%d%H%M")
+    await call.answer()
+    await _send_appointments_page(
+        call.message,
+        callback_data.view,
+        datetime.strptime(callback_data.start, "%Y%m%d").date(),
+        datetime.strptime(callback_data.end, "%Y%m%d").date(),
+        (to_starts_at(after_at), callback_data.after_id),
+    )
+
 
+# Каталог услуг
+@router.message(Command("services"))
+async def list_services(message: Message, state: FSMContext):
+    await state.clear()
+    if not is_admin(message.from_user.id):
+        return
+    lines = [f"#{s.id} {s.title} [{s.audience}]" for s in get_catalog().services]
+    await message.answer(
+        "Услуги:\n" + "\n".join(lines) + "\n\nИзменить цену: /price ID цена"
+        if lines else "Активных услуг нет."
+    )
+
+@router.message(Command("price"))
+async def change_price(message: Message, state: FSMContext):
+    await state.clear()
+    if not is_admin(message.from_user.id):
+        return
+    args = (message.text or "").split()[1:]
+    if len(args) != 2 or not all(a.isdigit() for a in args):
+        return await message.answer("Формат: /price ID цена, например /price 1 2700")
+    service_id, price = map(int, args)
+    if not await set_service_price(service_id, price):
+        return await message.answer("❌ Услуга не найдена.")
+    service = (await reload_catalog()).get(service_id)
+    await message.answer(f"✅ Цена обновлена: {service.title}")
@@ -1,14 +1,17 @@
 # handlers/booking.py
 
 from aiogram import Router, F
-from aiogram.types import Message, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from aiogram.types import Message, CallbackQuery, KeyboardButton, ReplyKeyboardMarkup
 from aiogram.filters.state import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from datetime import datetime
+from datetime import date, datetime
 
-from utils import parse_russian_datetime, send_with_main_menu
-from services.storage import is_slot_taken, save_appointment
+from utils import parse_russian_datetime, format_russian_date, to_starts_at, send_with_main_menu
+from services.availability import availability, DEFAULT_DURATION
+from services.catalog import AUDIENCES, Service, get_catalog
+from services.storage import reserve_slot, hold_slot, release_holds
+from keyboards.calendar import CalendarCallback, month_kb, day_kb, confirm_kb, slot_from_callback
 
 router = Router()
 
@@ -16,17 +19,19 @@ class BookingStates(StatesGroup):
     choosing_gender = State()
     choosing_service = State()
     choosing_datetime = State()
+    confirming = State()   # время выбрано и временно забронировано (slot_holds)
 
-# Услуги для разных полов (можно скорректировать списки)
-FEMALE_SERVICES = [
-    "Классический массаж — 60 мин — 2 500₽",
-    "Массаж спины + (зона ШВЗ) — 40 мин — 2 000₽",
-    "Антицеллюлитный массаж — 60 мин — 2 000₽",
-]
-MALE_SERVICES = [
-    "Классический массаж — 60 мин — 2 500₽",
-    "Массаж спины + (зона ШВЗ) — 40 мин — 2 500₽",
-]
+# Календарь остаётся рабочим и после выбора времени — до подтверждения
+_PICKING = StateFilter(BookingStates.choosing_datetime, BookingStates.confirming)
+
+async def _service_choice(message: Message, state: FSMContext) -> dict | bool:
+    """
+    Фильтр: текст кнопки — услуга из каталога для выбранного пола.
+    Найденная услуга передаётся в хэндлер аргументом service.
+    """
+    audience = (await state.get_data()).get("audience")
+    service = get_catalog().find(message.text or "", audience)
+    return {"service": service} if service else False
 
 @router.message(F.text == "📅 Записаться")
 async def start_booking(message: Message, state: FSMContext):
@@ -41,16 +46,18 @@ async def start_booking(message: Message, state: FSMContext):
     await message.answer("Выберите ваш пол:", reply_markup=kb)
     await state.set_state(BookingStates.choosing_gender)
 
-@router.message(BookingStates.choosing_gender, F.text.in_(["Девушка", "Мужчина"]))
+@router.message(BookingStates.choosing_gender, F.text.in_(AUDIENCES))
 async def choose_gender(message: Message, state: FSMContext):
     gender = message.text
-    await state.update_data(gender=gender)
+    audience = AUDIENCES[gender]
+    await state.update_data(gender=gender, audience=audience)
 
-    # Выбираем прайс-лист по полу
-    services = FEMALE_SERVICES if gender == "Девушка" else MALE_SERVICES
+    # Прайс-лист по полу берём из каталога услуг
+    services = get_catalog().for_audience(audience)
     kb = ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text=s)] for s in services] + [[KeyboardButton(text="⬅️ Назад")]],
-        resize_keyboard=True
+        keyboard=[[KeyboardButton(text=s.title)] for s in services] + [[KeyboardButton(text="⬅️ Назад")]],
+        resize_keyboard=True,
+        one_time_keyboard=True  # дальше выбор идёт в inline-календаре
     )
     await message.answer("Выберите услугу:", reply_markup=kb)
     await state.set_state(BookingStates.choosing_service)
@@ -59,12 +66,16 @@ async def choose_gender(message: Message, state: FSMContext):
 async def choose_gender_invalid(message: Message):
     await message.answer("❌ Пожалуйста, выберите «Девушка» или «Мужчина» кнопкой.")
 
-@router.message(BookingStates.choosing_service, StateFilter(F.text.in_(FEMALE_SERVICES + MALE_SERVICES)))
-async def choose_service(message: Message, state: FSMContext):
-    await state.update_data(service=message.text)
+@router.message(BookingStates.choosing_service, _service_choice)
+async def choose_service(message: Message, state: FSMContext, service: Service):
+    await state.update_data(service=service.title, service_id=service.id, duration=service.duration)
+    slots = availability.next_free(1, duration=service.duration)
+    if not slots:
+        await state.clear()
+        return await send_with_main_menu(message, "😔 Свободных окон пока нет, загляните позже.")
     await message.answer(
-        "Введите дату и время (пример: 31 мая 14:00):",
-        reply_markup=ReplyKeyboardRemove()
+        "Выберите дату в календаре или введите дату и время (пример: 31 мая 14:00):",
+        reply_markup=month_kb(slots[0].year, slots[0].month, service.duration)
     )
     await state.set_state(BookingStates.choosing_datetime)
 
@@ -72,7 +83,55 @@ async def choose_service(message: Message, state: FSMContext):
 async def choose_service_invalid(message: Message):
     await message.answer("❌ Пожалуйста, выберите услугу кнопкой из списка.")
 
-@router.message(BookingStates.choosing_datetime)
+@router.callback_query(_PICKING, CalendarCallback.filter(F.action == "month"))
+async def calendar_month(call: CallbackQuery, callback_data: CalendarCallback, state: FSMContext):
+    if await state.get_state() == BookingStates.confirming:
+        # «Другое время»: отпускаем бронь, чтобы слот видели другие
+        await release_holds(call.from_user.id)
+        await state.update_data(held_at=None)
+        await state.set_state(BookingStates.choosing_datetime)
+    await call.message.edit_text(
+        "Выберите дату:",
+        reply_markup=month_kb(callback_data.year, callback_data.month, await _duration(state))
+    )
+    await call.answer()
+
+@router.callback_query(_PICKING, CalendarCallback.filter(F.action == "day"))
+async def calendar_day(call: CallbackQuery, callback_data: CalendarCallback, state: FSMContext):
+    day = date(callback_data.year, callback_data.month, callback_data.day)
+    await call.message.edit_text(
+        f"Свободное время на {format_russian_date(day)}:",
+        reply_markup=day_kb(day, await _duration(state))
+    )
+    await call.answer()
+
+@router.callback_query(_PICKING, CalendarCallback.filter(F.action == "time"))
+async def calendar_time(call: CallbackQuery, callback_data: CalendarCallback, state: FSMContext):
+    dt = slot_from_callback(callback_data)
+    # календарь мог быть открыт ещё утром
+    if dt < datetime.now():
+        return await call.answer("❌ Это время уже прошло, выберите другое.", show_alert=True)
+    await call.answer()
+    await _hold(call.message, state, call.from_user.id, dt)
+
+@router.callback_query(BookingStates.confirming, CalendarCallback.filter(F.action == "confirm"))
+async def calendar_confirm(call: CallbackQuery, state: FSMContext):
+    await call.answer()
+    await _reserve(call.message, state, call.from_user.id)
+
+@router.callback_query(_PICKING, CalendarCallback.filter(F.action == "cancel"))
+async def calendar_cancel(call: CallbackQuery, state: FSMContext):
+    await release_holds(call.from_user.id)
+    await state.clear()
+    await call.answer()
+    await send_with_main_menu(call.message, "Отмена. Главное меню:")
+
+@router.callback_query(CalendarCallback.filter())
+async def calendar_idle(call: CallbackQuery, callback_data: CalendarCallback):
+    # пустые клетки и календари из уже завершённых диалогов
+    await call.answer(None if callback_data.action == "ignore" else "Календарь устарел, начните запись заново.")
+
+@router.message(_PICKING)
 async def choose_datetime(message: Message, state: FSMContext):
     text = message.text
     try:
@@ -83,19 +142,83 @@ async def choose_datetime(message: Message, state: FSMContext):
     if dt < datetime.now():
         return await message.answer("❌ Выбрана прошедшая дата.")
 
-    date_str = dt.strftime("%d %B")
-    time_str = dt.strftime("%H:%M")
+    await _hold(message, state, message.from_user.id, dt)
+
+async def _duration(state: FSMContext) -> int:
+    return (await state.get_data()).get("duration", DEFAULT_DURATION)
 
-    if await is_slot_taken(date_str, time_str):
-        return await message.answer("❌ Слот занят, выберите другое время.")
+async def _hold(message: Message, state: FSMContext, user_id: int, dt: datetime):
+    """
+    Временно бронирует сеанс с началом в dt и просит подтвердить запись.
+    Если время пересекается с другой записью или чужой бронью или его нет
+    в расписании — снова показывает календарь его месяца.
+    """
+    data = await state.get_data()
+    duration = data.get("duration", DEFAULT_DURATION)
+    # своя прежняя бронь не мешает выбрать соседнее время
+    held_at = datetime.fromisoformat(data["held_at"]) if data.get("held_at") else None
+    if not availability.is_free(dt, duration, ignore=held_at):
+        return await message.answer(
+            "❌ Это время недоступно, выберите другое:",
+            reply_markup=month_kb(dt.year, dt.month, duration)
+        )
+
+    date_str = format_russian_date(dt)
+    time_str = dt.strftime("%H:%M")
+    hold = await hold_slot(user_id, dt, duration)
+    if hold is None:
+        await state.update_data(held_at=None)
+        await state.set_state(BookingStates.choosing_datetime)
+        return await message.answer(
+            "❌ Слот занят, выберите другое время.",
+            reply_markup=month_kb(dt.year, dt.month, duration)
+        )
+
+    await state.update_data(held_at=to_starts_at(dt))
+    await state.set_state(BookingStates.confirming)
+    await message.answer(
+        f"Проверьте запись:\n"
+        f"<b>Услуга:</b> {data['service']}\n"
+        f"<b>Дата:</b> {date_str}\n"
+        f"<b>Время:</b> {time_str}\n\n"
+        f"⏳ Время закреплено за вами до {hold.held_until:%H:%M}.",
+        reply_markup=confirm_kb(dt.year, dt.month)
+    )
 
+async def _reserve(message: Message, state: FSMContext, user_id: int):
+    """
+    Превращает временную бронь клиента в запись. Если бронь истекла
+    и время уже заняли или сеанс уже начался — снова показывает календарь его месяца.
+    """
     data = await state.get_data()
-    appt_id = await save_appointment({
-        "user_id": message.from_user.id,
+    duration = data.get("duration", DEFAULT_DURATION)
+    dt = datetime.fromisoformat(data["held_at"])
+    date_str = format_russian_date(dt)
+    time_str = dt.strftime("%H:%M")
+
+    if dt < datetime.now():
+        await release_holds(user_id)
+        await state.update_data(held_at=None)
+        await state.set_state(BookingStates.choosing_datetime)
+        now = datetime.now()
+        return await message.answer(
+            "❌ Это время уже прошло. Выберите другое.",
+            reply_markup=month_kb(now.year, now.month, duration)
+        )
+
+    reservation = await reserve_slot({
+        "user_id": user_id,
         "service": data["service"],
-        "date": date_str,
-        "time": time_str
+        "starts_at": dt,
+        "duration": duration
     })
+    if reservation.slot_taken:
+        await state.update_data(held_at=None)
+        await state.set_state(BookingStates.choosing_datetime)
+        return await message.answer(
+            "❌ Бронь истекла, и это время уже заняли. Выберите другое.",
+            reply_markup=month_kb(dt.year, dt.month, duration)
+        )
 
     payment_info = (
         "🔔 Для подтверждения брони переведите 500 ₽ на номер +7 XXX XXX XX XX.\n"
@@ -113,10 +236,6 @@ async def choose_datetime(message: Message, state: FSMContext):
     )
     await state.clear()
 
-@router.message(BookingStates.choosing_datetime)
-async def choose_datetime_invalid(message: Message):
-    await message.answer("❌ Неверный ввод. Введите дату и время, например: 31 мая 14:00")
-
 # Общий хэндлер «Назад» для всех состояний BookingStates
 @router.message(F.text == "⬅️ Назад", StateFilter(BookingStates))
 async def booking_go_back(message: Message, state: FSMContext):
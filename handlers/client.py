@@ -1,29 +1,28 @@
 # handlers/client.py
 
 from aiogram import Router, F
-from aiogram.types import Message, KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove
+from aiogram.types import Message, KeyboardButton, ReplyKeyboardMarkup
 from aiogram.filters.command import Command
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from datetime import datetime, timedelta
 
 from config import ADMIN_IDS
-from utils import parse_russian_datetime, send_with_main_menu
+from utils import (
+    parse_russian_datetime, format_russian_date, record_button, record_id_from_button,
+)
 from services.storage import (
-    get_user_appointments,
-    cancel_appointment,
-    update_appointment,
-    is_slot_taken,
-    save_appointment,
+    get_upcoming_user_appointments,
+    get_appointment,
+    cancel_by_id,
+    reschedule_by_id,
 )
-from keyboards.client_kb import client_menu, admin_menu
+from services.availability import availability, DEFAULT_DURATION
+from services.catalog import get_catalog
+from keyboards.client_kb import client_menu, admin_menu, free_slots_kb
 
 router = Router()
 
-class BookingStates(StatesGroup):
-    choosing_service = State()
-    choosing_datetime = State()
-
 class CancelStates(StatesGroup):
     choosing = State()
 
@@ -52,76 +51,14 @@ async def on_start(message: Message, state: FSMContext):
     else:
         await message.answer(f"Привет, {message.from_user.full_name}!", reply_markup=client_menu())
 
-# запись
-SERVICES = [
-    "Классический массаж — 60 мин — 2 500₽",
-    "Спина + ШВЗ — 40 мин — 2 000₽",
-    "Антицеллюлитный массаж — 60 мин — 2 000₽",
-]
-
-@router.message(F.text == "📅 Записаться")
-async def start_booking(message: Message, state: FSMContext):
-    await state.clear()
-    kb = ReplyKeyboardMarkup(resize_keyboard=True)
-    for s in SERVICES:
-        kb.add(KeyboardButton(text=s))
-    kb.add(KeyboardButton(text="⬅️ Назад"))
-    await message.answer("Выберите услугу:", reply_markup=kb)
-    await state.set_state(BookingStates.choosing_service)
-
-@router.message(BookingStates.choosing_service)
-async def choose_service(message: Message, state: FSMContext):
-    if message.text == "⬅️ Назад":
-        return await go_back(message, state)
-    service = message.text
-    if service not in SERVICES:
-        return await message.answer("Пожалуйста, выберите услугу кнопкой.")
-    await state.update_data(service=service)
-    await message.answer("Введите дату и время (например: 31 мая 14:00):", reply_markup=ReplyKeyboardRemove())
-    await state.set_state(BookingStates.choosing_datetime)
-
-@router.message(BookingStates.choosing_datetime)
-async def choose_datetime(message: Message, state: FSMContext):
-    text = message.text
-    try:
-        dt = parse_russian_datetime(text)
-    except:
-        return await message.answer("❌ Неверный формат. Пример: 31 мая 14:00")
-    if dt < datetime.now():
-        return await message.answer("❌ Вы выбрали прошедшую дату.")
-    date_str = dt.strftime("%d %B")
-    time_str = dt.strftime("%H:%M")
-    if await is_slot_taken(date_str, time_str):
-        return await message.answer("❌ Слот занят. Выберите другое время.")
-    data = await state.get_data()
-    await save_appointment({
-        "user_id": message.from_user.id,
-        "service": data["service"],
-        "date": date_str,
-        "time": time_str
-    })
-    await send_with_main_menu(
-        message,
-        f"✅ Вы записаны!\n\n"
-        f"<b>Услуга:</b> {data['service']}\n"
-        f"<b>Дата:</b> {date_str}\n"
-        f"<b>Время:</b> {time_str}"
-    )
-    await state.clear()
+# Сколько записей показывать кнопками за раз
+PAGE_SIZE = 8
+MORE_BUTTON = "➡️ Ещё записи"
 
 # мои записи
 @router.message(F.text == "🗓 Мои записи")
 async def my_records(message: Message):
-    recs = await get_user_appointments(message.from_user.id)
-    now = datetime.now()
-    out = []
-    for r in recs:
-        try:
-            dt = parse_russian_datetime(f"{r['date']} {r['time']}")
-            if r["status"] != "отменена" and dt > now:
-                out.append(r)
-        except:
-            pass
+    out = await get_upcoming_user_appointments(message.from_user.id, limit=PAGE_SIZE * 3)
     if not out:
         return await message.answer("Нет актуальных записей.")
     text = "🗓 Ваши записи:\n\n"
@@ -130,63 +67,112 @@ async def my_records(message: Message):
                  f"   {r['service']} | {r['status']} | {r['payment_status']}\n\n")
     await message.answer(text)
 
+async def _send_records_page(
+    message: Message, state: FSMContext, prompt: str, after: tuple[str, int] | None = None
+) -> bool:
+    """
+    Показывает кнопками страницу записей, которые можно отменить или перенести
+    (не позднее чем за 24 ч). Ключ следующей страницы хранится в FSM как cursor.
+    Возвращает False, если таких записей нет.
+    """
+    recs = await get_upcoming_user_appointments(
+        message.from_user.id, min_lead=timedelta(hours=24), limit=PAGE_SIZE + 1, after=after
+    )
+    has_more = len(recs) > PAGE_SIZE
+    recs = recs[:PAGE_SIZE]
+    if not recs:
+        return False
+    await state.update_data(
+        record_ids=[r["id"] for r in recs],
+        cursor=[recs[-1]["starts_at"], recs[-1]["id"]] if has_more else None,
+    )
+    rows = [[KeyboardButton(text=record_button(r))] for r in recs]
+    if has_more:
+        rows.append([KeyboardButton(text=MORE_BUTTON)])
+    rows.append([KeyboardButton(text="⬅️ Назад")])
+    await message.answer(prompt, reply_markup=ReplyKeyboardMarkup(keyboard=rows, resize_keyboard=True))
+    return True
+
+async def _next_records_page(message: Message, state: FSMContext, prompt: str) -> bool:
+    """
+    Обрабатывает кнопку «Ещё записи». Возвращает True, если она была нажата.
+    """
+    if message.text != MORE_BUTTON:
+        return False
+    cursor = (await state.get_data()).get("cursor")
+    if not cursor or not await _send_records_page(message, state, prompt, tuple(cursor)):
+        await message.answer("Больше записей нет.")
+    return True
+
 # отмена
 @router.message(F.text == "❌ Отменить запись")
 async def cancel_start(message: Message, state: FSMContext):
-    recs = await get_user_appointments(message.from_user.id)
-    now = datetime.now()
-    valid = [r for r in recs if r["status"]!="отменена" and parse_russian_datetime(f"{r['date']} {r['time']}")-now>timedelta(hours=24)]
-    if not valid:
+    if not await _send_records_page(message, state, "Выберите запись:"):
         return await message.answer("Нет записей для отмены.")
     await state.set_state(CancelStates.choosing)
-    await state.update_data(records=valid)
-    kb = ReplyKeyboardMarkup(resize_keyboard=True)
-    for r in valid:
-        kb.add(KeyboardButton(text=f"{r['date']} {r['time']}"))
-    kb.add(KeyboardButton(text="⬅️ Назад"))
-    await message.answer("Выберите запись:", reply_markup=kb)
+
+async def _chosen_record_id(message: Message, state: FSMContext) -> int | None:
+    """
+    ID записи, выбранной кнопкой, если она есть среди предложенных пользователю.
+    """
+    appt_id = record_id_from_button(message.text)
+    if appt_id is None or appt_id not in (await state.get_data()).get("record_ids", []):
+        return None
+    return appt_id
 
 @router.message(CancelStates.choosing)
 async def cancel_confirm(message: Message, state: FSMContext):
     if message.text == "⬅️ Назад":
         return await go_back(message, state)
-    recs = (await state.get_data())["records"]
-    match = next((r for r in recs if f"{r['date']} {r['time']}"==message.text), None)
-    if not match:
+    if await _next_records_page(message, state, "Выберите запись:"):
+        return
+    appt_id = await _chosen_record_id(message, state)
+    if appt_id is None:
         return await message.answer("Неверный выбор.")
-    await cancel_appointment(message.from_user.id, match["date"], match["time"])
+    if not (await cancel_by_id(appt_id, user_id=message.from_user.id)).ok:
+        await state.clear()
+        return await message.answer("Запись не найдена.", reply_markup=client_menu())
     await message.answer("✅ Отменено.", reply_markup=client_menu())
     await state.clear()
 
 # перенос
+def _reschedule_window(record: dict) -> dict:
+    """
+    Аргументы проверок availability для переносимой записи (строки или данных FSM):
+    её длительность и собственное время, которое не считается занятым.
+    """
+    return {
+        "duration": record.get("duration") or DEFAULT_DURATION,
+        "ignore": datetime.fromisoformat(record["starts_at"]),
+    }
+
 @router.message(F.text == "🔁 Перенести запись")
 async def resch_start(message: Message, state: FSMContext):
-    recs = await get_user_appointments(message.from_user.id)
-    now = datetime.now()
-    valid = [r for r in recs if r["status"]!="отменена" and parse_russian_datetime(f"{r['date']} {r['time']}")-now>timedelta(hours=24)]
-    if not valid:
+    if not await _send_records_page(message, state, "Выберите старую запись:"):
         return await message.answer("Нет записей для переноса.")
     await state.set_state(RescheduleStates.choosing)
-    await state.update_data(records=valid)
-    kb = ReplyKeyboardMarkup(resize_keyboard=True)
-    for r in valid:
-        kb.add(KeyboardButton(text=f"{r['date']} {r['time']}"))
-    kb.add(KeyboardButton(text="⬅️ Назад"))
-    await message.answer("Выберите старую запись:", reply_markup=kb)
 
 @router.message(RescheduleStates.choosing)
 async def resch_choose_old(message: Message, state: FSMContext):
     if message.text == "⬅️ Назад":
         return await go_back(message, state)
-    recs = (await state.get_data())["records"]
-    match = next((r for r in recs if f"{r['date']} {r['time']}"==message.text), None)
-    if not match:
+    if await _next_records_page(message, state, "Выберите старую запись:"):
+        return
+    appt_id = await _chosen_record_id(message, state)
+    record = await get_appointment(appt_id) if appt_id is not None else None
+    if record is None:
         return await message.answer("Неверный выбор.")
-    await state.update_data(old=match)
+    # своё же время записи при переносе не считается занятым
+    await state.update_data(old_id=appt_id, starts_at=record["starts_at"], duration=record["duration"])
     await state.set_state(RescheduleStates.new_time)
-    await message.answer("Введите новую дату и время:", reply_markup=ReplyKeyboardRemove())
-    # показать «Назад»
-    await message.answer("Если хотите отменить — нажмите «⬅️ Назад»", reply_markup=ReplyKeyboardMarkup([[KeyboardButton("⬅️ Назад")]], resize_keyboard=True))
+    slots = availability.next_free(
+        8, after=datetime.now() + timedelta(hours=24), **_reschedule_window(record)
+    )
+    await message.answer(
+        "Выберите новое время или введите своё (например: 31 мая 14:00).\n"
+        "Если хотите отменить — нажмите «⬅️ Назад»",
+        reply_markup=free_slots_kb(slots)
+    )
 
 @router.message(RescheduleStates.new_time)
 async def resch_confirm(message: Message, state: FSMContext):
@@ -198,21 +184,32 @@ async def resch_confirm(message: Message, state: FSMContext):
         return await message.answer("❌ Неверный формат.")
     if dt < datetime.now() + timedelta(hours=24):
         return await message.answer("❌ Менее чем за 24 ч.")
-    old = (await state.get_data())["old"]
-    new_d, new_t = dt.strftime("%d %B"), dt.strftime("%H:%M")
-    await update_appointment(message.from_user.id, old["date"], old["time"], new_d, new_t)
+    data = await state.get_data()
+    window = _reschedule_window(data)
+    if not availability.is_free(dt, **window):
+        return await message.answer(
+            "❌ Это время недоступно. Ближайшие свободные окна:",
+            reply_markup=free_slots_kb(availability.next_free(8, after=dt, **window))
+        )
+    new_d, new_t = format_russian_date(dt), dt.strftime("%H:%M")
+    result = await reschedule_by_id(data["old_id"], dt, user_id=message.from_user.id)
+    if result.slot_taken:
+        return await message.answer("❌ Слот занят. Выберите другое время.")
+    if not result.ok:
+        await state.clear()
+        return await message.answer("Запись не найдена.", reply_markup=client_menu())
     await message.answer(f"✅ Перенесено на {new_d} {new_t}", reply_markup=client_menu())
     await state.clear()
 
 # прайс и контакты
 @router.message(F.text == "💰 Прайс-лист")
 async def price_list(message: Message):
-    await message.answer(
-        "💰 Прайс-лист:\n\n"
-        "— Классический — 60 мин — 2 500₽\n"
-        "— Спина+ШВЗ — 40 мин — 2 000₽\n"
-        "— Антицеллюлитный — 60 мин — 2 000₽"
-    )
+    audience_labels = {"female": " (для девушек)", "male": " (для мужчин)"}
+    lines = [
+        f"— {s.title}{audience_labels.get(s.audience, '')}"
+        for s in get_catalog().services
+    ]
+    await message.answer("💰 Прайс-лист:\n\n" + ("\n".join(lines) or "Услуги пока не добавлены."))
 
 @router.message(F.text == "📞 Контакты")
 async def contacts(message: Message):
@@ -0,0 +1,111 @@
+# keyboards/calendar.py
+
+import calendar
+from datetime import date, datetime, time
+from functools import lru_cache
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from services.availability import availability, DEFAULT_DURATION
+
+_MONTH_TITLES = [
+    "", "Январь", "Февраль", "Март", "Апрель", "Май", "Июнь",
+    "Июль", "Август", "Сентябрь", "Октябрь", "Ноябрь", "Декабрь",
+]
+_WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+
+class CalendarCallback(CallbackData, prefix="cal"):
+    """
+    action: month — показать месяц, day — показать время дня,
+    time — выбран слот (minute — минута суток), confirm — подтверждение
+    выбранного слота, ignore — пустая клетка, cancel — выход из календаря.
+    """
+    action: str
+    year: int = 0
+    month: int = 0
+    day: int = 0
+    minute: int = 0
+
+
+def _button(text: str, **kwargs) -> InlineKeyboardButton:
+    return InlineKeyboardButton(text=text, callback_data=CalendarCallback(**kwargs).pack())
+
+
+def _blank(text: str = " ") -> InlineKeyboardButton:
+    return _button(text, action="ignore")
+
+
+def _shift_month(year: int, month: int, delta: int) -> tuple[int, int]:
+    index = year * 12 + month - 1 + delta
+    return index // 12, index % 12 + 1
+
+
+@lru_cache(maxsize=64)
+def _month_kb(year: int, month: int, duration: int, version: int, today: date) -> InlineKeyboardMarkup:
+    # version и today участвуют только в ключе кэша
+    first = date(year, month, 1)
+    last = date(year, month, calendar.monthrange(year, month)[1])
+    free = {d.day for d in availability.free_days(max(first, today), last, duration)}
+
+    rows = [[_blank(f"{_MONTH_TITLES[month]} {year}")], [_blank(w) for w in _WEEKDAYS]]
+    for week in calendar.monthcalendar(year, month):
+        rows.append([
+            _button(str(d), action="day", year=year, month=month, day=d) if d in free
+            else _blank("·" if d else " ")
+            for d in week
+        ])
+
+    prev_y, prev_m = _shift_month(year, month, -1)
+    next_y, next_m = _shift_month(year, month, 1)
+    can_go_back = (year, month) > (today.year, today.month)
+    rows.append([
+        _button("◀️", action="month", year=prev_y, month=prev_m) if can_go_back else _blank(),
+        _button("✖️ Отмена", action="cancel"),
+        _button("▶️", action="month", year=next_y, month=next_m),
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+@lru_cache(maxsize=64)
+def _day_kb(day: date, duration: int, version: int, after: time | None) -> InlineKeyboardMarkup:
+    slots = [t for t in availability.free_slots(day, duration) if after is None or t > after]
+    buttons = [
+        _button(t.strftime("%H:%M"), action="time",
+                year=day.year, month=day.month, day=day.day, minute=t.hour * 60 + t.minute)
+        for t in slots
+    ]
+    rows = [buttons[i:i + 4] for i in range(0, len(buttons), 4)]
+    rows.append([_button("⬅️ К месяцу", action="month", year=day.year, month=day.month)])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def month_kb(year: int, month: int, duration: int = DEFAULT_DURATION) -> InlineKeyboardMarkup:
+    """
+    Календарь месяца: кликабельны только дни, где помещается сеанс длительностью duration.
+    Готовая клавиатура кэшируется до следующего изменения индекса свободных слотов.
+    """
+    return _month_kb(year, month, duration, availability.version, date.today())
+
+
+def day_kb(day: date, duration: int = DEFAULT_DURATION) -> InlineKeyboardMarkup:
+    """
+    Свободное для сеанса длительностью duration время дня
+    (для сегодняшнего дня — только ещё не прошедшее).
+    """
+    now = datetime.now()
+    after = now.time().replace(second=0, microsecond=0) if day == now.date() else None
+    return _day_kb(day, duration, availability.version, after)
+
+
+def confirm_kb(year: int, month: int) -> InlineKeyboardMarkup:
+    """Подтверждение выбранного времени или возврат к календарю его месяца."""
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        _button("✅ Подтвердить", action="confirm"),
+        _button("🔄 Другое время", action="month", year=year, month=month),
+    ]])
+
+
+def slot_from_callback(data: CalendarCallback) -> datetime:
+    return datetime(data.year, data.month, data.day, data.minute // 60, data.minute % 60)
@@ -1,7 +1,11 @@
 # keyboards/client_kb.py
 
+from datetime import datetime
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
+from utils import format_russian_datetime
+
 def client_menu() -> ReplyKeyboardMarkup:
     return ReplyKeyboardMarkup(
         keyboard=[
@@ -25,3 +29,14 @@ def admin_menu() -> ReplyKeyboardMarkup:
         ],
         resize_keyboard=True
     )
+
+def free_slots_kb(slots: list[datetime]) -> ReplyKeyboardMarkup:
+    """
+    Клавиатура ближайших свободных слотов (по два в ряд) и «Назад».
+    """
+    buttons = [KeyboardButton(text=format_russian_datetime(dt)) for dt in slots]
+    return ReplyKeyboardMarkup(
+        keyboard=[buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+                 + [[KeyboardButton(text="⬅️ Назад")]],
+        resize_keyboard=True
+    )
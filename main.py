@@ -2,63 +2,151 @@
 
 import os
 import asyncio
+import re
+import signal
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.types import BotCommand
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
-from config import BOT_TOKEN
+from config import BOT_TOKEN, FSM_TTL_HOURS, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET
 from database.db import init_db
-from notifications import scheduler, schedule_all_notifications
+from database.pool import open_pool, close_pool
+from notifications import scheduler, dispatcher, schedule_all_notifications
+from services.sender import sender
+from services.fsm_storage import SQLiteStorage
+from services.storage import load_availability, sweep_expired_holds
+from services.catalog import reload_catalog
+from middlewares.metrics import setup_metrics
+from middlewares.concurrency import ChatIsolation, setup_concurrency
 from handlers.booking import router as booking_router
 from handlers.client import router as client_router
 from handlers.admin import router as admin_router
 
-async def start_healthcheck_server():
+async def start_healthcheck_server(
+    dp: Dispatcher | None = None,
+    bot: Bot | None = None,
+    secret_token: str | None = None,
+) -> web.AppRunner:
     """
     Запускает минимальный HTTP-сервер на порту из $PORT,
     чтобы Render увидел слушающий порт и не убил контейнер.
+    Если переданы dp и bot, на том же приложении по WEBHOOK_PATH
+    принимаются апдейты Telegram (с проверкой секретного токена).
+    По /metrics отдаются метрики Prometheus.
     """
     port = int(os.environ.get("PORT", 8000))
     app = web.Application()
     async def ping(request):
         return web.Response(text="OK")
-    app.add_routes([web.get("/", ping)])
+    async def metrics(request):
+        return web.Response(body=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+    app.add_routes([web.get("/", ping), web.get("/metrics", metrics)])
+    if dp is not None and bot is not None:
+        SimpleRequestHandler(
+            dispatcher=dp, bot=bot, secret_token=secret_token
+        ).register(app, path=WEBHOOK_PATH)
+        # startup/shutdown диспетчера привязываются к жизненному циклу приложения
+        setup_application(app, dp, bot=bot)
     runner = web.AppRunner(app)
     await runner.setup()
     site = web.TCPSite(runner, "0.0.0.0", port)
     await site.start()
     print(f"🌐 Healthcheck server started on port {port}")
+    return runner
+
+async def wait_for_shutdown():
+    """
+    Ждёт SIGINT/SIGTERM, чтобы корректно остановить бота в режиме webhook.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+def check_webhook_config():
+    """
+    В режиме webhook секрет обязан быть общим для всех экземпляров бота:
+    каждый из них регистрирует webhook с этим секретом, и случайный секрет
+    последнего запущенного экземпляра отсёк бы апдейты остальных.
+    """
+    if not WEBHOOK_URL:
+        return
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("Задан WEBHOOK_URL, но не задан WEBHOOK_SECRET")
+    if not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", WEBHOOK_SECRET):
+        raise RuntimeError("WEBHOOK_SECRET: от 1 до 256 символов A-Z, a-z, 0-9, _ и -")
 
 async def main():
+    check_webhook_config()
+
     # 1) Инициализируем базу
     await init_db()
+    await open_pool()
+    await load_availability()
+    await reload_catalog()
 
-    # 2) Стартуем HTTP-сервер для healthcheck
-    await start_healthcheck_server()
-
-    # 3) Создаём бота
+    # 2) Создаём бота
     bot = Bot(
         token=BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
-    dp = Dispatcher(storage=MemoryStorage())
+    fsm_storage = SQLiteStorage(ttl=FSM_TTL_HOURS * 3600)
+    fsm_storage.start_eviction()
+    dp = Dispatcher(storage=fsm_storage, events_isolation=ChatIsolation())
+    setup_metrics(dp)
+    setup_concurrency(dp)
 
-    # 4) Регистрируем команды и роутеры
-    await bot.set_my_commands([BotCommand("start", "Главное меню")])
+    # 3) Регистрируем роутеры
     dp.include_router(admin_router)
     dp.include_router(client_router)
     dp.include_router(booking_router)
 
-    # 5) Планируем напоминания
-    await schedule_all_notifications(bot)
-    scheduler.start()
+    # 4) Стартуем HTTP-сервер для healthcheck (и webhook, если он включён)
+    if WEBHOOK_URL:
+        runner = await start_healthcheck_server(dp, bot, WEBHOOK_SECRET)
+    else:
+        runner = await start_healthcheck_server()
+
+    try:
+        # 5) Регистрируем команды
+        await bot.set_my_commands([BotCommand(command="start", description="Главное меню")])
+
+        # 6) Запускаем планировщик и сверяем сохранённые напоминания с БД
+        await schedule_all_notifications(bot)
+        # истёкшие временные брони слотов убираем из БД раз в минуту
+        scheduler.add_job(
+            sweep_expired_holds, "interval", minutes=1,
+            id="sweep_slot_holds", replace_existing=True,
+        )
 
-    print("🤖 Bot started, polling…")
-    # 6) Запускаем поллинг
-    await dp.start_polling(bot)
+        # 7) Получаем апдейты: webhook или поллинг
+        if WEBHOOK_URL:
+            await bot.set_webhook(
+                f"{WEBHOOK_URL}{WEBHOOK_PATH}",
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            print("🤖 Bot started, webhook…")
+            await wait_for_shutdown()
+        else:
+            # webhook, оставшийся от прошлого деплоя, мешает getUpdates
+            await bot.delete_webhook()
+            print("🤖 Bot started, polling…")
+            await dp.start_polling(bot)
+    finally:
+        await runner.cleanup()
+        await dispatcher.stop()
+        await sender.stop()
+        if scheduler.running:
+            scheduler.shutdown(wait=False)
+        await fsm_storage.close()
+        await close_pool()
+        await bot.session.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
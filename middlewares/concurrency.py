@@ -0,0 +1,122 @@
+# middlewares/concurrency.py
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.filters import ExceptionTypeFilter
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+from aiogram.types import ErrorEvent, TelegramObject, Update
+
+from config import MAX_CONCURRENT_UPDATES, MAX_QUEUED_UPDATES
+from services.metrics import UPDATES_IN_FLIGHT, UPDATES_QUEUED, UPDATES_SHED
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateShed(Exception):
+    """Апдейт отброшен: чат прислал слишком много апдейтов подряд."""
+
+
+class _ChatLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0   # обрабатывающий апдейт + ждущие своей очереди
+
+
+class ChatIsolation(BaseEventIsolation):
+    """
+    Изоляция событий для FSM aiogram: Dispatcher(events_isolation=ChatIsolation()).
+    Апдейты одного чата (ключа FSM) обрабатываются строго по очереди, причём
+    состояние читается для выбора хэндлера уже под замком: двойное нажатие
+    кнопки увидит состояние, оставленное первым нажатием.
+    Замок живёт, пока у ключа есть апдейты в работе, и удаляется, как только
+    чат затих. Больше max_pending апдейтов одного чата не ждут — лишние
+    отбрасываются (UpdateShed гасит обработчик ошибок из setup_concurrency).
+    """
+
+    def __init__(self, max_pending: int = 5):
+        self.max_pending = max_pending
+        self._locks: dict[StorageKey, _ChatLock] = {}
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = _ChatLock()
+        if entry.users >= self.max_pending:
+            UPDATES_SHED.labels("chat").inc()
+            raise UpdateShed(f"чат {key.chat_id}")
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if not entry.users:
+                del self._locks[key]
+
+    async def close(self) -> None:
+        self._locks.clear()
+
+
+class ConcurrencyMiddleware(BaseMiddleware):
+    """
+    Внешний middleware на dp.update: разные чаты идут параллельно, но одновременно
+    работают не больше max_in_flight хэндлеров; ещё max_queued апдейтов ждут,
+    остальные отбрасываются. Порядок внутри чата обеспечивает ChatIsolation.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = MAX_CONCURRENT_UPDATES,
+        max_queued: int = MAX_QUEUED_UPDATES,
+    ):
+        self.max_queued = max_queued
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._waiting = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        if self._semaphore.locked() and self._waiting >= self.max_queued:
+            UPDATES_SHED.labels("overload").inc()
+            logger.warning(f"Апдейт {event.update_id} отброшен (overload)")
+            return None
+        self._waiting += 1
+        UPDATES_QUEUED.inc()
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+            UPDATES_QUEUED.dec()
+        UPDATES_IN_FLIGHT.inc()
+        try:
+            return await handler(event, data)
+        finally:
+            UPDATES_IN_FLIGHT.dec()
+            self._semaphore.release()
+
+
+async def _on_shed(event: ErrorEvent):
+    logger.warning(f"Апдейт {event.update.update_id} отброшен ({event.exception})")
+
+
+def setup_concurrency(dp: Dispatcher, **kwargs) -> ConcurrencyMiddleware:
+    """
+    Подключает общий лимит одновременной обработки и гасит UpdateShed из
+    ChatIsolation (её саму нужно передать в Dispatcher(events_isolation=...)).
+    Вызывать после setup_metrics, чтобы время ожидания в очереди попадало
+    в bot_update_latency_seconds.
+    """
+    middleware = ConcurrencyMiddleware(**kwargs)
+    dp.update.outer_middleware(middleware)
+    dp.errors.register(_on_shed, ExceptionTypeFilter(UpdateShed))
+    return middleware
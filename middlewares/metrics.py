@@ -0,0 +1,70 @@
+# middlewares/metrics.py
+
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Dispatcher
+from aiogram.types import TelegramObject, Update
+
+from services.metrics import (
+    UPDATES, UPDATE_ERRORS, UPDATE_LATENCY, HANDLER_LATENCY, HANDLER_ERRORS,
+)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Внешний middleware на dp.update: считает апдейты и ошибки
+    и меряет полное время обработки по типу апдейта.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: dict[str, Any],
+    ) -> Any:
+        event_type = event.event_type
+        UPDATES.labels(event_type).inc()
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            UPDATE_ERRORS.labels(event_type).inc()
+            raise
+        finally:
+            UPDATE_LATENCY.labels(event_type).observe(time.perf_counter() - start)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Middleware на уровне событий (message, callback_query): к этому моменту
+    хэндлер уже выбран, поэтому время и ошибки пишутся по его имени.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        callback = data["handler"].callback
+        name = f"{callback.__module__}.{callback.__name__}"
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(name).inc()
+            raise
+        finally:
+            HANDLER_LATENCY.labels(name).observe(time.perf_counter() - start)
+
+
+def setup_metrics(dp: Dispatcher):
+    """
+    Подключает метрики ко всем роутерам диспетчера
+    (middleware на dp распространяются на вложенные роутеры).
+    """
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    handler_metrics = HandlerMetricsMiddleware()
+    dp.message.middleware(handler_metrics)
+    dp.callback_query.middleware(handler_metrics)
@@ -1,115 +1,256 @@
+import asyncio
+import heapq
 import logging
 from datetime import datetime, timedelta, date
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.date import DateTrigger
 from apscheduler.triggers.cron import CronTrigger
 from aiogram import Bot
 
-from utils import parse_russian_datetime
-from services.storage import get_all_appointments, get_appointments_by_range
+from services.sender import sender
+from services.storage import (
+    get_appointments_by_range, get_appointment, on_appointment_change,
+    replace_reminders, get_appointments_without_reminders,
+    get_pending_reminders, claim_reminders, mark_reminders_sent, release_reminders,
+)
 from config import ADMIN_IDS
+from utils import format_russian_date
 
 logger = logging.getLogger(__name__)
-scheduler = AsyncIOScheduler()
+
+# Задачи планировщика живут только в памяти и заново ставятся при каждом старте:
+# напоминания хранятся в таблице notifications, а планировщику остаются
+# ежедневная сводка и служебные задачи.
+scheduler = AsyncIOScheduler(
+    job_defaults={"misfire_grace_time": 15 * 60, "coalesce": True},
+)
+
+_WHEN = {"day": "за день", "hour": "за час"}
+
+
+def _reminders_for(r: dict, now: datetime) -> list[tuple[str, int, datetime]]:
+    """
+    Напоминания для записи: [(type, chat_id, due_at)].
+    type = '<client|admin>_<day|hour>'.
+    Отменённые и неоплаченные записи напоминаний не получают.
+    """
+    if r["status"] == "отменена" or r.get("payment_status") != "оплачено":
+        return []
+    if not r.get("starts_at"):
+        return []
+
+    dt = datetime.fromisoformat(r["starts_at"])
+    recipients = [("client", r["user_id"])] + [("admin", admin_id) for admin_id in ADMIN_IDS]
+    reminders = []
+
+    # напоминание за день в 09:00 и за час до
+    day_before = (dt - timedelta(days=1)).replace(hour=9, minute=0, second=0)
+    hour_before = dt - timedelta(hours=1)
+    for when, due_at in (("day", day_before), ("hour", hour_before)):
+        if due_at > now:
+            for who, chat_id in recipients:
+                reminders.append((f"{who}_{when}", chat_id, due_at))
+    return reminders
+
+
+class ReminderDispatcher:
+    """
+    Один фоновый цикл вместо отдельной задачи планировщика на каждое напоминание.
+
+    В памяти держится только куча (due_at, id) ближайших напоминаний из
+    таблицы notifications — не дальше lookahead и не больше window_size штук.
+    Цикл спит до ближайшего due_at, берёт пачку в отправку на время lease
+    (claim_reminders) и при исчерпании окна подгружает следующее.
+    sent_at ставится только после доставки; недоставленное напоминание
+    возвращается в очередь и повторяется через retry_delay, пока не кончатся
+    max_attempts попыток. Если процесс упал посреди отправки, после
+    перезапуска напоминание снова берётся, когда истечёт его аренда.
+    """
+
+    def __init__(
+        self,
+        lookahead: timedelta = timedelta(hours=6),
+        window_size: int = 500,
+        grace: timedelta = timedelta(minutes=15),
+        lease: timedelta = timedelta(minutes=10),
+        retry_delay: timedelta = timedelta(minutes=1),
+        max_attempts: int = 3,
+    ):
+        self.lookahead = lookahead
+        self.window_size = window_size
+        self.grace = grace
+        self.lease = lease
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self._heap: list[tuple[datetime, int]] = []
+        self._window_end = datetime.min
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def push(self, reminders: list[dict]):
+        """
+        Добавляет только что созданные напоминания, если они попадают
+        в загруженное окно; более поздние подтянутся при следующей загрузке.
+        """
+        added = False
+        for rem in reminders:
+            due_at = datetime.fromisoformat(rem["due_at"])
+            if due_at <= self._window_end:
+                heapq.heappush(self._heap, (due_at, rem["id"]))
+                added = True
+        if added:
+            self._wakeup.set()
+
+    async def _refill(self, now: datetime):
+        until = now + self.lookahead
+        rows = await get_pending_reminders(now - self.grace, until, self.window_size, self.max_attempts)
+        self._heap = [(self._ready_at(r), r["id"]) for r in rows]
+        heapq.heapify(self._heap)
+        # если окно заполнено целиком, дальше последнего загруженного не заглядываем
+        if len(rows) >= self.window_size:
+            self._window_end = datetime.fromisoformat(rows[-1]["due_at"])
+        else:
+            self._window_end = until
+
+    def _ready_at(self, row: dict) -> datetime:
+        ready_at = datetime.fromisoformat(row["due_at"])
+        # прошлая отправка не удалась — повтор не раньше retry_delay
+        if row["not_before"] is not None:
+            ready_at = max(ready_at, datetime.fromisoformat(row["not_before"]))
+        # напоминание взято в отправку (упавшим процессом) — ждём конца аренды
+        if row["claimed_at"] is not None:
+            ready_at = max(ready_at, datetime.fromisoformat(row["claimed_at"]) + self.lease)
+        return ready_at
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = datetime.now()
+            try:
+                if now >= self._window_end:
+                    await self._refill(now)
+
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap)[1])
+                if due:
+                    await self._dispatch(due)
+                    continue
+            except Exception as e:
+                logger.error(f"Ошибка диспетчера напоминаний: {e}")
+                await asyncio.sleep(5)
+                continue
+
+            next_at = min(self._heap[0][0], self._window_end) if self._heap else self._window_end
+            timeout = max((next_at - datetime.now()).total_seconds(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch(self, reminder_ids: list[int]):
+        claimed = await claim_reminders(reminder_ids, self.lease, self.max_attempts)
+        # пачка уходит параллельно, темп ограничивает очередь отправителя
+        results = await asyncio.gather(*(self._send(rem) for rem in claimed))
+        await mark_reminders_sent([rem["id"] for rem, ok in zip(claimed, results) if ok])
+        failed = [rem for rem, ok in zip(claimed, results) if not ok]
+        retry_at = datetime.now() + self.retry_delay
+        await release_reminders([rem["id"] for rem in failed], retry_at)
+        for rem in failed:
+            if rem["attempts"] < self.max_attempts:
+                heapq.heappush(self._heap, (retry_at, rem["id"]))
+            else:
+                logger.error(f"Напоминание id={rem['id']} не доставлено за {rem['attempts']} попыток")
+
+    @staticmethod
+    async def _send(rem: dict) -> bool:
+        who, when = rem["type"].split("_", 1)
+        dt = datetime.fromisoformat(rem["starts_at"])
+        if who == "client":
+            return await send_reminder(rem["chat_id"], dt, _WHEN[when])
+        return await send_admin_notification(rem["chat_id"], rem, dt, _WHEN[when])
+
+
+dispatcher = ReminderDispatcher()
+
+
+@on_appointment_change
+async def reschedule_appointment_notifications(appointment_id: int):
+    """
+    Пересчитывает напоминания одной записи после её изменения в БД.
+    """
+    r = await get_appointment(appointment_id)
+    reminders = _reminders_for(r, datetime.now()) if r else []
+    created = await replace_reminders(appointment_id, reminders)
+    dispatcher.push(created)
+
 
 async def schedule_all_notifications(bot: Bot):
     """
-    Планирует:
-      – персональные напоминания клиентам и админам за день и за час до сеанса
+    Запускает:
+      – диспетчер персональных напоминаний клиентам и админам
+        за день и за час до сеанса
       – ежедневную сводку администратору о записях на завтра
+    При старте только сверяет состояние: создаёт напоминания для оплаченных
+    записей, у которых их ещё нет.
     """
-    # очищаем старые задачи
-    scheduler.remove_all_jobs()
+    sender.start(bot)
+
+    if not scheduler.running:
+        scheduler.start()
 
     now = datetime.now()
-    recs = await get_all_appointments()
-
-    for r in recs:
-        # фильтруем отменённые и неоплаченные
-        if r["status"] == "отменена" or r.get("payment_status") != "оплачено":
-            continue
-
-        # парсим дату+время
-        dt = parse_russian_datetime(f"{r['date']} {r['time']}")
-
-        # напоминание за день в 09:00
-        day_before = (dt - timedelta(days=1)).replace(hour=9, minute=0, second=0)
-        if day_before > now:
-            scheduler.add_job(
-                send_reminder,
-                trigger=DateTrigger(run_date=day_before),
-                args=[bot, r["user_id"], dt, "за день"],
-                id=f"reminder_day_{r['id']}",
-                replace_existing=True,
-            )
-            for admin_id in ADMIN_IDS:
-                scheduler.add_job(
-                    send_admin_notification,
-                    trigger=DateTrigger(run_date=day_before),
-                    args=[bot, admin_id, r, dt, "за день"],
-                    id=f"admin_day_{r['id']}_{admin_id}",
-                    replace_existing=True,
-                )
-
-        # напоминание за час до
-        hour_before = dt - timedelta(hours=1)
-        if hour_before > now:
-            scheduler.add_job(
-                send_reminder,
-                trigger=DateTrigger(run_date=hour_before),
-                args=[bot, r["user_id"], dt, "за час"],
-                id=f"reminder_hour_{r['id']}",
-                replace_existing=True,
-            )
-            for admin_id in ADMIN_IDS:
-                scheduler.add_job(
-                    send_admin_notification,
-                    trigger=DateTrigger(run_date=hour_before),
-                    args=[bot, admin_id, r, dt, "за час"],
-                    id=f"admin_hour_{r['id']}_{admin_id}",
-                    replace_existing=True,
-                )
+    for r in await get_appointments_without_reminders(now):
+        await replace_reminders(r["id"], _reminders_for(r, now))
+
+    dispatcher.start()
 
     # ежедневная сводка: каждый день в 18:00
     scheduler.add_job(
         send_daily_summary,
         trigger=CronTrigger(hour=18, minute=0),
-        args=[bot],
         id="daily_summary",
         replace_existing=True,
     )
 
-    # запуск планировщика
-    if not scheduler.running:
-        scheduler.start()
-
-async def send_reminder(bot: Bot, user_id: int, dt: datetime, when: str):
-    text = f"📅 Напоминание: ваша запись {dt.strftime('%d %B %Y в %H:%M')} — {when}!"
-    try:
-        await bot.send_message(user_id, text)
-    except Exception as e:
-        logger.error(f"Не удалось отправить напоминание ({when}) user_id={user_id}: {e}")
+async def send_reminder(user_id: int, dt: datetime, when: str) -> bool:
+    text = f"📅 Напоминание: ваша запись {format_russian_date(dt)} {dt.year} в {dt:%H:%M} — {when}!"
+    if not await sender.send(user_id, text):
+        logger.error(f"Не удалось отправить напоминание ({when}) user_id={user_id}")
+        return False
+    return True
 
-async def send_admin_notification(bot: Bot, admin_id: int, appointment: dict, dt: datetime, when: str):
+async def send_admin_notification(admin_id: int, appointment: dict, dt: datetime, when: str) -> bool:
     text = (
         f"⚙️ Напоминание админу ({when}):\n"
         f"Пользователь u{appointment['user_id']} — {appointment['service']}\n"
-        f"Дата: {dt.strftime('%d %B %Y в %H:%M')}"
+        f"Дата: {format_russian_date(dt)} {dt.year} в {dt:%H:%M}"
     )
-    try:
-        await bot.send_message(admin_id, text)
-    except Exception as e:
-        logger.error(f"Не удалось отправить уведомление админу={admin_id}: {e}")
+    if not await sender.send(admin_id, text):
+        logger.error(f"Не удалось отправить уведомление админу={admin_id}")
+        return False
+    return True
 
-async def send_daily_summary(bot: Bot):
+async def send_daily_summary():
     """
     Ежедневная рассылка администратору списка всех записей на завтра.
     """
     tomorrow = date.today() + timedelta(days=1)
-    start = tomorrow.strftime('%d %B')
-    end = start  # только одна дата
-    recs = await get_appointments_by_range(start, end)
+    start = format_russian_date(tomorrow)
+    recs = await get_appointments_by_range(tomorrow, tomorrow)
 
     if not recs:
         text = f"📋 Рассылка: нет записей на {start}."
@@ -117,8 +258,7 @@ async def send_daily_summary(bot: Bot):
         lines = [f"{r['time']} — {r['service']} (u{r['user_id']})" for r in recs]
         text = "📋 Записи на завтра (" + start + "):\n" + "\n".join(lines)
 
-    for admin_id in ADMIN_IDS:
-        try:
-            await bot.send_message(admin_id, text)
-        except Exception as e:
-            logger.error(f"Не удалось отправить сводку админу={admin_id}: {e}")
+    results = await asyncio.gather(*(sender.send(admin_id, text) for admin_id in ADMIN_IDS))
+    for admin_id, delivered in zip(ADMIN_IDS, results):
+        if not delivered:
+            logger.error(f"Не удалось отправить сводку админу={admin_id}")
@@ -0,0 +1,198 @@
+# services/availability.py
+
+import heapq
+from bisect import bisect_left, insort
+from datetime import date, datetime, time, timedelta
+from typing import Iterable
+
+from services.schedule import Rule, Schedule
+
+
+def _minute(dt: datetime) -> int:
+    return dt.hour * 60 + dt.minute
+
+
+def _bits(mask: int) -> Iterable[int]:
+    """Номера установленных битов по возрастанию — O(число битов)."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# Длительность сеанса, если она не указана (старые записи, вызовы без услуги)
+DEFAULT_DURATION = 60
+_DAY = 24 * 60
+
+
+class AvailabilityIndex:
+    """
+    Свободные слоты в памяти.
+    Слоты расписания дня — битовая маска по минутам суток (бит i — слот,
+    начинающийся в i-ю минуту), которую по требованию разворачивает
+    services.schedule.Schedule из правил и исключений. Для каждого дня
+    храним отсортированный список занятых интервалов [начало, конец)
+    в минутах от полуночи дня начала.
+    Активные записи не пересекаются, поэтому концы интервалов тоже
+    отсортированы и проверка пересечения — один bisect, O(log n).
+    Слот свободен для услуги длительностью d, если он есть в расписании
+    и [слот, слот + d) не пересекается ни с одной записью.
+    Временные брони (holds) лежат в тех же списках интервалов до held_until;
+    истёкшие снимаются лениво — при следующем чтении индекса.
+    Индекс строится один раз из БД (services.storage.load_availability)
+    и дальше обновляется точечно при каждой записи, отмене, переносе
+    и правке расписания. version растёт при каждом изменении.
+    """
+
+    def __init__(self):
+        self._schedule = Schedule()
+        self._booked: dict[date, list[tuple[int, int]]] = {}
+        self._holds: dict[int, datetime] = {}                 # hold_id -> начало
+        self._hold_expiry: list[tuple[datetime, int]] = []    # куча (held_until, hold_id)
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        self._expire_holds()
+        return self._version
+
+    def rebuild(
+        self,
+        schedule: Schedule,
+        booked: Iterable[tuple[datetime, int]],
+        holds: Iterable[tuple[int, datetime, int, datetime]] = (),
+    ):
+        """
+        booked — пары (начало, длительность в минутах) активных записей,
+        holds — (hold_id, начало, длительность, held_until) действующих временных броней.
+        """
+        self._schedule = schedule
+        self._booked.clear()
+        self._holds.clear()
+        self._hold_expiry.clear()
+        for dt, duration in booked:
+            self._booked.setdefault(dt.date(), []).append((_minute(dt), _minute(dt) + duration))
+        for intervals in self._booked.values():
+            intervals.sort()
+        for hold_id, dt, duration, held_until in holds:
+            self.hold(hold_id, dt, duration, held_until)
+        self._version += 1
+
+    def add_rule(self, rule: Rule) -> dict[date, int]:
+        changes = self._schedule.add_rule(rule)
+        self._version += 1
+        return changes
+
+    def add_slot(self, dt: datetime):
+        self._schedule.set_exception(dt, True)
+        self._version += 1
+
+    def remove_slot(self, dt: datetime):
+        self._schedule.set_exception(dt, False)
+        self._version += 1
+
+    def book(self, dt: datetime, duration: int = DEFAULT_DURATION):
+        insort(self._booked.setdefault(dt.date(), []), (_minute(dt), _minute(dt) + duration))
+        self._version += 1
+
+    def release(self, dt: datetime):
+        day = dt.date()
+        intervals = self._booked.get(day, [])
+        i = bisect_left(intervals, (_minute(dt),))
+        if i < len(intervals) and intervals[i][0] == _minute(dt):
+            intervals.pop(i)
+            if not intervals:
+                del self._booked[day]
+        self._version += 1
+
+    def hold(self, hold_id: int, dt: datetime, duration: int, held_until: datetime):
+        """Временно занимает интервал до held_until."""
+        self.book(dt, duration)
+        self._holds[hold_id] = dt
+        heapq.heappush(self._hold_expiry, (held_until, hold_id))
+
+    def release_hold(self, hold_id: int):
+        """Снимает временную бронь (подтверждена, отменена или истекла)."""
+        dt = self._holds.pop(hold_id, None)
+        if dt is not None:
+            self.release(dt)
+
+    def _expire_holds(self):
+        now = datetime.now()
+        while self._hold_expiry and self._hold_expiry[0][0] <= now:
+            self.release_hold(heapq.heappop(self._hold_expiry)[1])
+
+    def _overlaps(self, day: date, start: int, end: int, ignore: int | None) -> bool:
+        """
+        Пересекает ли [start, end) (минуты от полуночи day) занятый интервал дня,
+        кроме начинающегося в минуту ignore.
+        """
+        intervals = self._booked.get(day)
+        if not intervals:
+            return False
+        # последний интервал, начинающийся раньше end, — единственный кандидат
+        i = bisect_left(intervals, (end,)) - 1
+        if i >= 0 and intervals[i][0] == ignore:
+            i -= 1
+        return i >= 0 and intervals[i][1] > start
+
+    def is_busy(self, dt: datetime, duration: int = DEFAULT_DURATION,
+                ignore: datetime | None = None) -> bool:
+        """
+        Пересекается ли [dt, dt + duration) с активной записью — O(log n).
+        ignore — начало записи, которую не учитывать (переносимая запись).
+        Учитываются записи предыдущего дня, заходящие за полночь, и наоборот.
+        """
+        self._expire_holds()
+        start, end = _minute(dt), _minute(dt) + duration
+        for shift in (0, -1, 1) if end > _DAY else (0, -1):
+            day = dt.date() + timedelta(days=shift)
+            skip = _minute(ignore) if ignore is not None and ignore.date() == day else None
+            if self._overlaps(day, start - shift * _DAY, end - shift * _DAY, skip):
+                return True
+        return False
+
+    def _free_minutes(self, day: date, duration: int, ignore: datetime | None) -> Iterable[int]:
+        start = datetime.combine(day, time())
+        for m in _bits(self._schedule.day_mask(day)):
+            if not self.is_busy(start + timedelta(minutes=m), duration, ignore):
+                yield m
+
+    def is_free(self, dt: datetime, duration: int = DEFAULT_DURATION,
+                ignore: datetime | None = None) -> bool:
+        """Есть ли в расписании слот ровно в dt, не пересекающийся с записями — O(log n)."""
+        return bool(self._schedule.day_mask(dt.date()) >> _minute(dt) & 1) \
+            and not self.is_busy(dt, duration, ignore)
+
+    def free_slots(self, day: date, duration: int = DEFAULT_DURATION,
+                   ignore: datetime | None = None) -> list[time]:
+        """Свободные слоты дня по возрастанию — O(k log n)."""
+        return [time(m // 60, m % 60) for m in self._free_minutes(day, duration, ignore)]
+
+    def free_days(self, first: date, last: date, duration: int = DEFAULT_DURATION) -> list[date]:
+        """Дни от first до last включительно, где есть свободные слоты."""
+        return [
+            day for day in self._schedule.days(first, last)
+            if any(True for _ in self._free_minutes(day, duration, None))
+        ]
+
+    def next_free(self, n: int, after: datetime | None = None, duration: int = DEFAULT_DURATION,
+                  ignore: datetime | None = None) -> list[datetime]:
+        """
+        Ближайшие n свободных слотов строго позже after (по умолчанию — сейчас).
+        Дни без слотов в расписании пропускаются без перебора минут.
+        """
+        after = after or datetime.now()
+        result = []
+        for day in self._schedule.days(after.date()):
+            for m in self._free_minutes(day, duration, ignore):
+                dt = datetime.combine(day, time()) + timedelta(minutes=m)
+                if dt <= after:
+                    continue
+                result.append(dt)
+                if len(result) >= n:
+                    return result
+        return result
+
+
+availability = AvailabilityIndex()
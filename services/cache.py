@@ -0,0 +1,90 @@
+# services/cache.py
+
+import asyncio
+import functools
+import time
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class QueryCache:
+    """
+    Кэш результатов запросов к БД в памяти.
+    Запись живёт ttl секунд и только пока не изменился version:
+    каждая запись в БД вызывает invalidate(), и все старые значения
+    перестают отдаваться. Одновременные промахи по одному ключу
+    выполняют запрос один раз.
+    Закэшированные значения общие — вызывающий код не должен их менять.
+    """
+
+    def __init__(self, ttl: float = 60, max_entries: int = 512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[Hashable, tuple[int, float, Any]] = {}
+        self._loading: dict[Hashable, asyncio.Future] = {}
+
+    def invalidate(self):
+        self.version += 1
+        self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "version": self.version,
+        }
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: float | None = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is not None:
+            version, expires_at, value = entry
+            if version == self.version and time.monotonic() < expires_at:
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        loading = self._loading.get((key, self.version))
+        if loading is not None:
+            self.hits += 1
+            return await asyncio.shield(loading)
+
+        self.misses += 1
+        version = self.version
+        future = asyncio.get_running_loop().create_future()
+        self._loading[(key, version)] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # исключение получат только те, кто ждал этот же запрос
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            # если пока шёл запрос данные изменились, результат уже устарел
+            if version == self.version:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+                self._entries[key] = (version, time.monotonic() + (ttl if ttl is not None else self.ttl), value)
+            return value
+        finally:
+            del self._loading[(key, version)]
+
+
+def cached(cache: QueryCache, ttl: float | None = None):
+    """
+    Декоратор для функций storage: результат кэшируется по имени функции
+    и позиционным аргументам (они должны быть хэшируемыми).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args):
+            return await cache.get_or_load((func.__name__, *args), lambda: func(*args), ttl)
+        return wrapper
+    return decorator
@@ -0,0 +1,73 @@
+# services/catalog.py
+
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping
+
+from services.storage import get_active_services
+
+# Кнопки выбора пола -> audience в таблице services
+AUDIENCES = {"Девушка": "female", "Мужчина": "male"}
+
+
+@dataclass(frozen=True)
+class Service:
+    id: int
+    name: str
+    duration: int      # минуты
+    price: int         # рубли
+    audience: str      # 'female' | 'male' | 'all'
+    description: str | None = None
+
+    @property
+    def title(self) -> str:
+        """Текст кнопки и значение appointments.service: "Классический массаж — 60 мин — 2 500₽"."""
+        price = f"{self.price:,}".replace(",", " ")
+        return f"{self.name} — {self.duration} мин — {price}₽"
+
+    def suits(self, audience: str) -> bool:
+        return self.audience in ("all", audience)
+
+
+@dataclass(frozen=True)
+class Catalog:
+    """
+    Неизменяемый снимок таблицы services. Подменяется целиком при reload_catalog(),
+    поэтому хэндлеры читают его без блокировок и без обращений к БД.
+    """
+    services: tuple[Service, ...] = ()
+    by_title: Mapping[str, tuple[Service, ...]] = MappingProxyType({})
+
+    def for_audience(self, audience: str) -> tuple[Service, ...]:
+        return tuple(s for s in self.services if s.suits(audience))
+
+    def find(self, title: str, audience: str | None = None) -> Service | None:
+        """Услуга по тексту кнопки (для audience — только подходящая ей)."""
+        for service in self.by_title.get(title, ()):
+            if audience is None or service.suits(audience):
+                return service
+        return None
+
+    def get(self, service_id: int) -> Service | None:
+        return next((s for s in self.services if s.id == service_id), None)
+
+
+_catalog = Catalog()
+
+
+def get_catalog() -> Catalog:
+    return _catalog
+
+
+async def reload_catalog() -> Catalog:
+    """
+    Перечитывает активные услуги из БД и подменяет снимок каталога.
+    Вызывается при старте и после каждого изменения услуг администратором.
+    """
+    global _catalog
+    services = tuple(Service(**row) for row in await get_active_services())
+    by_title: dict[str, tuple[Service, ...]] = {}
+    for service in services:
+        by_title[service.title] = by_title.get(service.title, ()) + (service,)
+    _catalog = Catalog(services, MappingProxyType(by_title))
+    return _catalog
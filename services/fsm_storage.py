@@ -0,0 +1,148 @@
+# services/fsm_storage.py
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from database.pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+
+def _key(key: StorageKey) -> str:
+    parts = (
+        key.bot_id, key.chat_id, key.user_id, key.thread_id,
+        getattr(key, "business_connection_id", None), key.destiny,
+    )
+    return ":".join("" if p is None else str(p) for p in parts)
+
+
+def _state_name(state: StateType) -> str | None:
+    return state.state if isinstance(state, State) else state
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram в таблице fsm_state той же SQLite-БД (через общий пул).
+    Незавершённые диалоги переживают перезапуск; состояния, не менявшиеся
+    дольше ttl секунд, считаются устаревшими и периодически удаляются.
+    """
+
+    def __init__(self, ttl: float = 24 * 3600, eviction_interval: float = 3600):
+        self.ttl = ttl
+        self.eviction_interval = eviction_interval
+        self._eviction_task: asyncio.Task | None = None
+
+    def _fresh_after(self) -> float:
+        return time.time() - self.ttl
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        # данные устаревшей (ещё не удалённой) строки не должны ожить вместе с новым состоянием
+        async with get_pool().writer() as db:
+            await db.execute(
+                """
+                INSERT INTO fsm_state (key, state, data, updated_at) VALUES (?, ?, '{}', ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    state = excluded.state,
+                    data = CASE WHEN fsm_state.updated_at <= ? THEN '{}' ELSE fsm_state.data END,
+                    updated_at = excluded.updated_at
+                """,
+                (_key(key), _state_name(state), time.time(), self._fresh_after())
+            )
+            # пустая запись не нужна: без состояния и данных диалога нет
+            await db.execute(
+                "DELETE FROM fsm_state WHERE key = ? AND state IS NULL AND data = '{}'",
+                (_key(key),)
+            )
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        async with get_pool().reader() as db:
+            async with db.execute(
+                "SELECT state FROM fsm_state WHERE key = ? AND updated_at > ?",
+                (_key(key), self._fresh_after())
+            ) as cur:
+                row = await cur.fetchone()
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        async with get_pool().writer() as db:
+            await self._write_data(db, key, data)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        async with get_pool().reader() as db:
+            async with db.execute(
+                "SELECT data FROM fsm_state WHERE key = ? AND updated_at > ?",
+                (_key(key), self._fresh_after())
+            ) as cur:
+                row = await cur.fetchone()
+        return json.loads(row[0]) if row else {}
+
+    async def update_data(self, key: StorageKey, data: Mapping[str, Any]) -> dict[str, Any]:
+        # чтение и запись в одной транзакции, чтобы параллельные апдейты не затирали друг друга
+        async with get_pool().writer() as db:
+            async with db.execute(
+                "SELECT data FROM fsm_state WHERE key = ? AND updated_at > ?",
+                (_key(key), self._fresh_after())
+            ) as cur:
+                row = await cur.fetchone()
+            current = json.loads(row[0]) if row else {}
+            current.update(data)
+            await self._write_data(db, key, current)
+        return current.copy()
+
+    async def _write_data(self, db, key: StorageKey, data: Mapping[str, Any]):
+        payload = json.dumps(dict(data), ensure_ascii=False, separators=(",", ":"))
+        # как и в set_state: состояние устаревшей строки сбрасывается
+        await db.execute(
+            """
+            INSERT INTO fsm_state (key, state, data, updated_at) VALUES (?, NULL, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                state = CASE WHEN fsm_state.updated_at <= ? THEN NULL ELSE fsm_state.state END,
+                data = excluded.data,
+                updated_at = excluded.updated_at
+            """,
+            (_key(key), payload, time.time(), self._fresh_after())
+        )
+        await db.execute(
+            "DELETE FROM fsm_state WHERE key = ? AND state IS NULL AND data = '{}'",
+            (_key(key),)
+        )
+
+    async def evict_stale(self) -> int:
+        """
+        Удаляет устаревшие состояния. Возвращает число удалённых строк.
+        """
+        async with get_pool().writer() as db:
+            cursor = await db.execute(
+                "DELETE FROM fsm_state WHERE updated_at <= ?",
+                (self._fresh_after(),)
+            )
+            return cursor.rowcount
+
+    def start_eviction(self):
+        if self._eviction_task is None:
+            self._eviction_task = asyncio.create_task(self._evict_periodically())
+
+    async def _evict_periodically(self):
+        while True:
+            try:
+                removed = await self.evict_stale()
+                if removed:
+                    logger.info(f"Удалено устаревших FSM-состояний: {removed}")
+            except Exception as e:
+                logger.error(f"Не удалось очистить FSM-состояния: {e}")
+            await asyncio.sleep(self.eviction_interval)
+
+    async def close(self) -> None:
+        if self._eviction_task is not None:
+            self._eviction_task.cancel()
+            try:
+                await self._eviction_task
+            except asyncio.CancelledError:
+                pass
+            self._eviction_task = None
@@ -0,0 +1,74 @@
+# services/metrics.py
+
+import functools
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Границы корзин: от единиц миллисекунд (SQLite) до секунд (Bot API под нагрузкой)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+UPDATES = Counter(
+    "bot_updates_total", "Полученные апдейты Telegram", ["event_type"]
+)
+UPDATE_ERRORS = Counter(
+    "bot_update_errors_total", "Апдейты, обработка которых закончилась исключением", ["event_type"]
+)
+UPDATE_LATENCY = Histogram(
+    "bot_update_latency_seconds", "Полное время обработки апдейта", ["event_type"],
+    buckets=LATENCY_BUCKETS,
+)
+HANDLER_LATENCY = Histogram(
+    "bot_handler_latency_seconds", "Время работы хэндлера", ["handler"],
+    buckets=LATENCY_BUCKETS,
+)
+HANDLER_ERRORS = Counter(
+    "bot_handler_errors_total", "Исключения в хэндлерах", ["handler"]
+)
+STORAGE_LATENCY = Histogram(
+    "storage_call_latency_seconds", "Время вызова функций services.storage", ["function"],
+    buckets=LATENCY_BUCKETS,
+)
+STORAGE_ERRORS = Counter(
+    "storage_call_errors_total", "Исключения в функциях services.storage", ["function"]
+)
+UPDATES_IN_FLIGHT = Gauge(
+    "bot_updates_in_flight", "Апдейты, которые сейчас обрабатываются хэндлерами"
+)
+UPDATES_QUEUED = Gauge(
+    "bot_updates_queued", "Апдейты, ждущие свободного места под общим лимитом"
+)
+UPDATES_SHED = Counter(
+    "bot_updates_shed_total", "Апдейты, отброшенные без обработки из-за перегрузки", ["reason"]
+)
+CACHE_HITS = Gauge("cache_hits", "Попадания в кэш запросов (с момента старта)", ["cache"])
+CACHE_MISSES = Gauge("cache_misses", "Промахи кэша запросов (с момента старта)", ["cache"])
+
+
+def timed(func):
+    """
+    Декоратор для async-функций storage: пишет время вызова и число ошибок
+    в storage_call_latency_seconds / storage_call_errors_total.
+    """
+    latency = STORAGE_LATENCY.labels(func.__name__)
+    errors = STORAGE_ERRORS.labels(func.__name__)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - start)
+    return wrapper
+
+
+def track_cache(name: str, cache):
+    """
+    Публикует счётчики попаданий/промахов QueryCache как метрики cache_*.
+    """
+    CACHE_HITS.labels(name).set_function(lambda: cache.hits)
+    CACHE_MISSES.labels(name).set_function(lambda: cache.misses)
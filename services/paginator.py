@@ -0,0 +1,35 @@
+# services/paginator.py
+
+from typing import AsyncIterator, Callable
+
+# Лимит Telegram — 4096 символов (в UTF-16) на сообщение; оставляем запас на эмодзи
+MESSAGE_LIMIT = 4000
+
+
+async def take_page(
+    rows: AsyncIterator[dict],
+    format_row: Callable[[dict], str],
+    header: str = "",
+    limit: int = MESSAGE_LIMIT,
+) -> tuple[str, dict | None]:
+    """
+    Собирает из потока строк одно сообщение не длиннее limit символов.
+    Возвращает текст и последнюю вошедшую строку, если в потоке остались
+    ещё строки (иначе None) — по ней строится ключ следующей страницы.
+    Как только страница заполнена, поток закрывается и дальше не читается.
+    """
+    parts = [header] if header else []
+    size = len(header)
+    last = None
+    try:
+        async for row in rows:
+            line = format_row(row)
+            added = len(line) + (1 if parts else 0)
+            if last is not None and size + added > limit:
+                return "\n".join(parts), last
+            parts.append(line)
+            size += added
+            last = row
+    finally:
+        await rows.aclose()
+    return "\n".join(parts), None
@@ -0,0 +1,150 @@
+# services/schedule.py
+
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator
+
+# Насколько далеко вперёд искать свободные слоты, если есть бессрочные правила
+SEARCH_HORIZON = timedelta(days=366)
+# Маска weekdays «все дни недели»
+ALL_WEEKDAYS = 0b1111111
+
+
+def _minute(dt: datetime) -> int:
+    return dt.hour * 60 + dt.minute
+
+
+def parse_hhmm(value: str) -> int:
+    """'14:30' -> минута суток."""
+    h, m = map(int, value.split(":"))
+    return h * 60 + m
+
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    Повторяющееся правило расписания (строка availability_rules):
+    в дни недели из weekdays (бит 0 — понедельник … бит 6 — воскресенье)
+    с date_from по date_to включительно (None — бессрочно) слоты начинаются
+    каждые step минут с минуты start и строго раньше минуты end.
+    is_open=False — правило, наоборот, закрывает все слоты в окне [start, end),
+    независимо от их шага.
+    """
+    id: int
+    weekdays: int
+    start: int
+    end: int
+    step: int
+    date_from: date
+    date_to: date | None = None
+    is_open: bool = True
+    mask: int = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.is_open:
+            mask = 0
+            for m in range(self.start, self.end, self.step):
+                mask |= 1 << m
+        else:
+            mask = (1 << self.end) - (1 << self.start)
+        object.__setattr__(self, "mask", mask)
+
+    def covers(self, day: date) -> bool:
+        return (
+            self.weekdays >> day.weekday() & 1
+            and self.date_from <= day
+            and (self.date_to is None or day <= self.date_to)
+        )
+
+    def produces(self, dt: datetime) -> bool:
+        """Задаёт ли правило слот dt."""
+        return bool(self.covers(dt.date()) and self.mask >> _minute(dt) & 1)
+
+
+class Schedule:
+    """
+    Расписание в виде правил и разовых исключений вместо строки на каждый слот.
+    Маска дня (бит i — слот в i-ю минуту) вычисляется по требованию:
+    правила применяются по возрастанию id (более позднее перекрывает раннее),
+    затем исключения — добавленные и удалённые вручную слоты.
+    Развёрнутые маски кэшируются по неделям; правка правила сбрасывает весь кэш,
+    правка исключения — только неделю этого дня.
+    """
+
+    def __init__(self, rules: Iterable[Rule] = (), exceptions: Iterable[tuple[datetime, bool]] = ()):
+        self._rules: list[Rule] = sorted(rules, key=lambda r: r.id)
+        self._exceptions: dict[date, dict[int, bool]] = {}
+        self._weeks: dict[date, tuple[int, ...]] = {}
+        for dt, available in exceptions:
+            self._exceptions.setdefault(dt.date(), {})[_minute(dt)] = available
+
+    @property
+    def rules(self) -> tuple[Rule, ...]:
+        return tuple(self._rules)
+
+    def add_rule(self, rule: Rule) -> dict[date, int]:
+        """
+        Добавляет правило. Исключения, которые оно перекрывает, больше не действуют —
+        так же их удаляет из БД services.storage.add_schedule_rule.
+        Возвращает {день: сколько слотов в нём открылось или закрылось} для дней,
+        которые правило изменило (у бессрочного — в пределах SEARCH_HORIZON).
+        """
+        last = rule.date_to or rule.date_from + SEARCH_HORIZON
+        before = {
+            day: self.day_mask(day)
+            for day in (rule.date_from + timedelta(days=i) for i in range((last - rule.date_from).days + 1))
+            if rule.covers(day)
+        }
+        self._rules.append(rule)
+        for day in list(self._exceptions):
+            if rule.covers(day):
+                slots = self._exceptions[day]
+                for m in [m for m in slots if rule.mask >> m & 1]:
+                    del slots[m]
+                if not slots:
+                    del self._exceptions[day]
+        self._weeks.clear()
+        changes = {day: (mask ^ self.day_mask(day)).bit_count() for day, mask in before.items()}
+        return {day: n for day, n in changes.items() if n}
+
+    def set_exception(self, dt: datetime, available: bool):
+        self._exceptions.setdefault(dt.date(), {})[_minute(dt)] = available
+        self._weeks.pop(dt.date() - timedelta(days=dt.weekday()), None)
+
+    def _expand_day(self, day: date) -> int:
+        mask = 0
+        for rule in self._rules:
+            if rule.covers(day):
+                mask = mask | rule.mask if rule.is_open else mask & ~rule.mask
+        for m, available in self._exceptions.get(day, {}).items():
+            mask = mask | (1 << m) if available else mask & ~(1 << m)
+        return mask
+
+    def day_mask(self, day: date) -> int:
+        monday = day - timedelta(days=day.weekday())
+        week = self._weeks.get(monday)
+        if week is None:
+            week = self._weeks[monday] = tuple(
+                self._expand_day(monday + timedelta(days=i)) for i in range(7)
+            )
+        return week[day.weekday()]
+
+    def horizon(self, since: date) -> date:
+        """Последний день, после которого слотов заведомо нет."""
+        last = since
+        for rule in self._rules:
+            if rule.is_open:
+                if rule.date_to is None:
+                    return since + SEARCH_HORIZON
+                last = max(last, rule.date_to)
+        added = [day for day, slots in self._exceptions.items() if any(slots.values())]
+        return max([last, *added])
+
+    def days(self, first: date, last: date | None = None) -> Iterator[date]:
+        """Дни от first до last включительно (по умолчанию — до horizon), где есть слоты."""
+        last = last or self.horizon(first)
+        day = first
+        while day <= last:
+            if self.day_mask(day):
+                yield day
+            day += timedelta(days=1)
@@ -0,0 +1,242 @@
+# services/sender.py
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramForbiddenError, TelegramBadRequest, TelegramNetworkError,
+    TelegramRetryAfter, TelegramServerError,
+)
+
+# Сообщения, которые так и не удалось доставить, пишутся в отдельный логгер
+dead_letter_logger = logging.getLogger("notifications.dead_letter")
+
+# Лимиты Bot API: ~30 сообщений в секунду на бота и 1 в секунду в один чат.
+# За любую секунду уходит не больше rate + burst сообщений, поэтому берём с запасом.
+GLOBAL_RATE = 25
+GLOBAL_BURST = 5
+PER_CHAT_RATE = 1
+
+
+class TokenBucket:
+    """
+    Ведро токенов: не больше rate операций в секунду в среднем
+    и не больше capacity подряд.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def idle(self) -> bool:
+        """Ведро полное и не на паузе — его можно забыть без потери точности."""
+        now = time.monotonic()
+        self._refill(now)
+        return self._tokens >= self.capacity and now >= self._paused_until
+
+    def pause(self, seconds: float):
+        """Запрещает выдачу токенов на seconds (ответ 429 от Telegram)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+    def delay(self) -> float:
+        """Через сколько секунд появится токен (0 — есть уже сейчас)."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._refill(now)
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def try_acquire(self) -> bool:
+        """Берёт токен, если он есть, не дожидаясь."""
+        if self.delay() > 0:
+            return False
+        self._tokens -= 1
+        return True
+
+    async def acquire(self):
+        async with self._lock:
+            while (delay := self.delay()) > 0:
+                await asyncio.sleep(delay)
+            self._tokens -= 1
+
+
+@dataclass
+class _Outgoing:
+    chat_id: int
+    text: str
+    kwargs: dict[str, Any]
+    done: asyncio.Future = field(repr=False)
+    attempt: int = 0
+
+
+class MessageSender:
+    """
+    Очередь исходящих сообщений:
+      – у каждого чата своя очередь: сообщения одного чата уходят по порядку;
+      – общий лимит на бота и отдельный лимит на каждый чат (TokenBucket);
+      – воркер берёт только чат, у которого уже есть токен, — чат, исчерпавший
+        свой лимит (например, админ, которому приходят копии всех напоминаний),
+        ждёт по таймеру и не занимает воркеры, пока остальные чаты отправляются;
+      – не больше concurrency одновременных запросов к Bot API;
+      – повтор после TelegramRetryAfter (с паузой всего отправителя)
+        и после сетевых/серверных ошибок;
+      – недоставленные сообщения пишутся в логгер notifications.dead_letter.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        global_burst: float = GLOBAL_BURST,
+        per_chat_rate: float = PER_CHAT_RATE,
+        concurrency: int = 8,
+        max_attempts: int = 5,
+        queue_size: int = 10_000,
+    ):
+        self.per_chat_rate = per_chat_rate
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats: dict[int, TokenBucket] = {}
+        # неотправленные сообщения по чатам; чат есть в словаре, пока очередь не пуста,
+        # и при этом стоит ровно в одном месте: в _ready, у воркера или на таймере
+        self._pending: dict[int, deque[_Outgoing]] = {}
+        self._ready: asyncio.Queue[int] = asyncio.Queue()
+        self._timers: dict[int, asyncio.TimerHandle] = {}
+        self._capacity = asyncio.Semaphore(queue_size)
+        self._workers: list[asyncio.Task] = []
+        self._bot: Bot | None = None
+
+    def start(self, bot: Bot):
+        self._bot = bot
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for queue in self._pending.values():
+            for item in queue:
+                if not item.done.done():
+                    item.done.set_result(False)
+        self._pending.clear()
+        self._ready = asyncio.Queue()
+
+    async def send(self, chat_id: int, text: str, **kwargs) -> bool:
+        """
+        Ставит сообщение в очередь чата и ждёт результата.
+        Возвращает True, если сообщение доставлено.
+        """
+        if not self._workers:
+            raise RuntimeError("Отправитель не запущен: вызовите sender.start(bot)")
+        async with self._capacity:
+            done = asyncio.get_running_loop().create_future()
+            item = _Outgoing(chat_id, text, kwargs, done)
+            queue = self._pending.get(chat_id)
+            if queue is None:
+                self._pending[chat_id] = deque([item])
+                self._schedule(chat_id)
+            else:
+                queue.append(item)
+            return await done
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) > 1000:
+                self._chats = {cid: b for cid, b in self._chats.items() if not b.idle}
+            bucket = self._chats[chat_id] = TokenBucket(self.per_chat_rate)
+        return bucket
+
+    def _schedule(self, chat_id: int, delay: float = 0.0):
+        """Отдаёт чат воркерам, как только у него появится токен (и пройдёт delay)."""
+        delay = max(delay, self._chat_bucket(chat_id).delay())
+        if delay <= 0:
+            self._ready.put_nowait(chat_id)
+        else:
+            self._timers[chat_id] = asyncio.get_running_loop().call_later(delay, self._wake, chat_id)
+
+    def _wake(self, chat_id: int):
+        self._timers.pop(chat_id, None)
+        self._ready.put_nowait(chat_id)
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            queue = self._pending[chat_id]
+            if not self._chat_bucket(chat_id).try_acquire():
+                self._schedule(chat_id)
+                continue
+            retry_in = await self._attempt(queue[0])
+            if retry_in is None:
+                queue.popleft()
+            if queue:
+                self._schedule(chat_id, retry_in or 0.0)
+            else:
+                del self._pending[chat_id]
+
+    async def _attempt(self, item: _Outgoing) -> float | None:
+        """
+        Одна попытка отправки (токен чата уже взят).
+        None — с сообщением покончено (доставлено или в dead letter),
+        иначе — через сколько секунд повторить.
+        """
+        item.attempt += 1
+        await self._global.acquire()
+        try:
+            await self._bot.send_message(item.chat_id, item.text, **item.kwargs)
+            self._finish(item, True)
+            return None
+        except TelegramRetryAfter as e:
+            # флуд-контроль действует на весь бот: притормаживаем всех
+            self._global.pause(e.retry_after)
+            self._chat_bucket(item.chat_id).pause(e.retry_after)
+            error, retry_in = e, 0.0
+        except (TelegramNetworkError, TelegramServerError) as e:
+            error, retry_in = e, min(2 ** item.attempt, 30)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # пользователь заблокировал бота или чат не существует — повтор не поможет
+            self._dead_letter(item, e)
+            return None
+        except Exception as e:
+            self._dead_letter(item, e)
+            return None
+
+        if item.attempt >= self.max_attempts:
+            self._dead_letter(item, error)
+            return None
+        return retry_in
+
+    @staticmethod
+    def _finish(item: _Outgoing, delivered: bool):
+        if not item.done.done():
+            item.done.set_result(delivered)
+
+    def _dead_letter(self, item: _Outgoing, error: Exception):
+        dead_letter_logger.error(
+            f"Сообщение не доставлено chat_id={item.chat_id} (попыток: {item.attempt}): "
+            f"{error!r}; текст: {item.text!r}"
+        )
+        self._finish(item, False)
+
+
+sender = MessageSender()
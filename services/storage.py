@@ -1,171 +1,788 @@
 # services/storage.py
 
-import aiosqlite
-from config import DB_PATH
+import logging
+import sqlite3
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Awaitable, Callable
 
-async def save_appointment(data: dict) -> int:
+from config import SLOT_HOLD_MINUTES
+from database.pool import get_pool
+from services.cache import QueryCache, cached
+from services.metrics import timed, track_cache
+from services.availability import availability, DEFAULT_DURATION
+from services.schedule import Rule, Schedule, parse_hhmm
+from utils import format_russian_date, to_starts_at
+
+logger = logging.getLogger(__name__)
+
+# Кэш читающих запросов; сбрасывается при любой записи в appointments и расписание
+query_cache = QueryCache(ttl=60)
+track_cache("storage", query_cache)
+
+# Подписчики на изменения записей (например, планировщик напоминаний).
+# Получают ID записи уже после коммита.
+_appointment_listeners: list[Callable[[int], Awaitable[None]]] = []
+
+def on_appointment_change(listener: Callable[[int], Awaitable[None]]):
+    """
+    Регистрирует обработчик, вызываемый после создания, переноса,
+    отмены или подтверждения оплаты записи.
+    """
+    _appointment_listeners.append(listener)
+    return listener
+
+async def _appointment_changed(*appointment_ids: int):
+    query_cache.invalidate()
+    for appointment_id in appointment_ids:
+        for listener in _appointment_listeners:
+            try:
+                await listener(appointment_id)
+            except Exception as e:
+                logger.error(f"Обработчик изменения записи id={appointment_id} упал: {e}")
+
+@dataclass(frozen=True)
+class Reservation:
+    """
+    Результат попытки занять слот:
+      appointment_id – ID созданной/перенесённой записи (None при неудаче);
+      slot_taken     – True, если слот уже занят другой записью.
     """
-    Сохраняет новую запись с дефолтными статусами:
-      status = 'запланирована'
-      payment_status = 'не оплачено'
-    Возвращает ID созданной записи.
+    appointment_id: int | None
+    slot_taken: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.appointment_id is not None
+
+SLOT_TAKEN = Reservation(appointment_id=None, slot_taken=True)
+
+@dataclass(frozen=True)
+class Mutation:
+    """
+    Результат изменения записи по ID:
+      count      – число изменённых строк (0 или 1);
+      row        – запись после изменения (RETURNING);
+      slot_taken – True, если перенос не удался из-за занятого слота.
+    """
+    count: int
+    row: dict | None = None
+    slot_taken: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.count > 0
+
+SLOT_TAKEN_MUTATION = Mutation(count=0, slot_taken=True)
+
+@dataclass(frozen=True)
+class Hold:
+    """
+    Временная бронь выбранного времени до held_until (строка slot_holds).
+    """
+    id: int
+    starts_at: datetime
+    duration: int
+    held_until: datetime
+
+# Активные записи, пересекающие новый интервал [начало, конец).
+# Сеанс короче суток, поэтому кандидатов ищем диапазоном по индексу активных
+# записей (starts_at) только среди начавшихся не раньше чем за сутки до нового.
+_OVERLAP_SQL = """
+    SELECT 1 FROM appointments AS other
+    WHERE other.status != 'отменена'
+      AND other.starts_at >= ? AND other.starts_at < ? AND other.ends_at > ?
+"""
+
+# Действующие временные брони других клиентов (user_id = NULL — любых),
+# пересекающие тот же интервал. Параметры: now, user_id, user_id, *_interval().
+_HOLD_OVERLAP_SQL = """
+    SELECT 1 FROM slot_holds AS hold
+    WHERE hold.held_until > ? AND (? IS NULL OR hold.user_id != ?)
+      AND hold.starts_at >= ? AND hold.starts_at < ? AND hold.ends_at > ?
+"""
+
+def _now() -> str:
+    return datetime.now().isoformat(sep=" ", timespec="seconds")
+
+def _interval(starts_at: datetime, duration: int) -> tuple[str, str, str]:
+    """Параметры _OVERLAP_SQL для [starts_at, starts_at + duration)."""
+    return (
+        to_starts_at(starts_at - timedelta(days=1)),
+        to_starts_at(starts_at + timedelta(minutes=duration)),
+        to_starts_at(starts_at),
+    )
+
+_RULE_COLUMNS = "id, weekdays, start_time, end_time, step, date_from, date_to, is_open"
+
+def _rule(row) -> Rule:
+    rule_id, weekdays, start_time, end_time, step, date_from, date_to, is_open = row
+    return Rule(
+        rule_id, weekdays, parse_hhmm(start_time), parse_hhmm(end_time), step,
+        date.fromisoformat(date_from), date.fromisoformat(date_to) if date_to else None,
+        bool(is_open)
+    )
+
+@timed
+async def load_availability():
+    """
+    Строит индекс свободных слотов (services.availability) по действующим
+    правилам расписания, будущим исключениям и активным записям.
+    Вызывается один раз при старте.
+    """
+    today = date.today()
+    async with get_pool().reader() as db:
+        async with db.execute(
+            f"SELECT {_RULE_COLUMNS} FROM availability_rules WHERE date_to IS NULL OR date_to >= ?",
+            (today.isoformat(),)
+        ) as cur:
+            rules = [_rule(row) for row in await cur.fetchall()]
+        async with db.execute(
+            "SELECT day, time, is_available FROM availability_exceptions WHERE day >= ?",
+            (today.isoformat(),)
+        ) as cur:
+            exceptions = [
+                (datetime.fromisoformat(f"{day} {time}"), bool(is_available))
+                for day, time, is_available in await cur.fetchall()
+            ]
+        # вчерашние записи тоже: поздний сеанс может заходить за полночь
+        async with db.execute(
+            """
+            SELECT starts_at, duration FROM appointments
+            WHERE status != 'отменена' AND starts_at >= ?
+            """,
+            ((today - timedelta(days=1)).isoformat(),)
+        ) as cur:
+            booked = [(datetime.fromisoformat(row[0]), row[1]) for row in await cur.fetchall()]
+        async with db.execute(
+            "SELECT id, starts_at, duration, held_until FROM slot_holds WHERE held_until > ?",
+            (_now(),)
+        ) as cur:
+            holds = [
+                (hold_id, datetime.fromisoformat(starts_at), duration, datetime.fromisoformat(held_until))
+                for hold_id, starts_at, duration, held_until in await cur.fetchall()
+            ]
+    availability.rebuild(Schedule(rules, exceptions), booked, holds)
+
+def _display(starts_at: datetime) -> tuple[str, str]:
+    """
+    Колонки date и time записи ("5 мая", "14:00") — только для показа:
+    года в них нет, поэтому время сеанса берётся из starts_at, а не из них.
+    """
+    return format_russian_date(starts_at), starts_at.strftime("%H:%M")
+
+@timed
+async def reserve_slot(data: dict) -> Reservation:
+    """
+    Атомарно проверяет, что интервал [начало, начало + duration) не пересекается
+    с активными записями и чужими временными бронями, и создаёт запись — одним
+    запросом на соединении записи. Временные брони клиента при этом снимаются
+    (его бронь превращается в запись). Уникальный частичный индекс по началу
+    активных записей страхует от гонки между процессами.
+    Запись создаётся со статусами 'запланирована' / 'не оплачено'.
     data = {
       'user_id': int,
       'service': str,
-      'date': str,
-      'time': str
+      'starts_at': datetime,
+      'duration': int   # минуты, по умолчанию DEFAULT_DURATION
     }
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            """
-            INSERT INTO appointments
-                (user_id, service, date, time, status, payment_status)
-            VALUES (?, ?, ?, ?, 'запланирована', 'не оплачено')
-            """,
-            (data["user_id"], data["service"], data["date"], data["time"])
-        )
-        await db.commit()
-        return cursor.lastrowid
+    user_id = data["user_id"]
+    starts_at = data["starts_at"]
+    duration = data.get("duration", DEFAULT_DURATION)
+    interval = _interval(starts_at, duration)
+    async with get_pool().writer() as db:
+        try:
+            cursor = await db.execute(
+                f"""
+                INSERT INTO appointments
+                    (user_id, service, date, time, starts_at, duration, ends_at, status, payment_status)
+                SELECT ?, ?, ?, ?, ?, ?, ?, 'запланирована', 'не оплачено'
+                WHERE NOT EXISTS ({_OVERLAP_SQL}) AND NOT EXISTS ({_HOLD_OVERLAP_SQL})
+                """,
+                (user_id, data["service"], *_display(starts_at),
+                 interval[2], duration, interval[1], *interval, _now(), user_id, user_id, *interval)
+            )
+        except sqlite3.IntegrityError:
+            return SLOT_TAKEN
+        if cursor.rowcount == 0:
+            return SLOT_TAKEN
+        released = await _delete_holds(db, "user_id = ?", user_id)
+    for hold_id in released:
+        availability.release_hold(hold_id)
+    availability.book(starts_at, duration)
+    await _appointment_changed(cursor.lastrowid)
+    return Reservation(cursor.lastrowid)
 
-async def is_slot_taken(date: str, time: str) -> bool:
+@timed
+async def is_slot_taken(starts_at: datetime, duration: int = DEFAULT_DURATION) -> bool:
     """
-    Проверяет, занят ли слот (любая не отменённая запись).
+    Проверяет по БД, пересекается ли сеанс длительностью duration, начинающийся
+    в starts_at, с любой не отменённой записью или действующей временной бронью.
+    Горячие пути (клавиатуры, предварительные проверки) пользуются индексом
+    services.availability.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
+    interval = _interval(starts_at, duration)
+    async with get_pool().reader() as db:
         async with db.execute(
-            """
-            SELECT COUNT(*) FROM appointments
-            WHERE date = ? AND time = ? AND status != 'отменена'
-            """,
-            (date, time)
+            f"SELECT EXISTS ({_OVERLAP_SQL}) OR EXISTS ({_HOLD_OVERLAP_SQL})",
+            (*interval, _now(), None, None, *interval)
         ) as cur:
-            cnt, = await cur.fetchone()
-            return cnt > 0
+            taken, = await cur.fetchone()
+            return bool(taken)
 
+@timed
 async def get_user_appointments(user_id: int) -> list[dict]:
     """
     Возвращает все записи пользователя (любые статусы, для клиента фильтрация по дате в хэндлерах).
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_pool().reader() as db:
         cur = await db.execute(
             """
-            SELECT id, date, time, service, status, payment_status
+            SELECT id, date, time, starts_at, service, status, payment_status
             FROM appointments
             WHERE user_id = ?
-            ORDER BY date, time
+            ORDER BY starts_at
             """,
             (user_id,)
         )
         rows = await cur.fetchall()
         return [dict(r) for r in rows]
 
-async def cancel_appointment(user_id: int, date: str, time: str):
+@timed
+async def get_upcoming_user_appointments(
+    user_id: int,
+    min_lead: timedelta = timedelta(0),
+    limit: int = 10,
+    after: tuple[str, int] | None = None,
+) -> list[dict]:
     """
-    Помечает запись отменённой.
+    Неотменённые записи пользователя, начинающиеся позже чем через min_lead,
+    по возрастанию времени — не больше limit штук.
+    after — ключ (starts_at, id) последней записи предыдущей страницы.
+    Использует индекс (user_id, starts_at): прошлые записи не читаются.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
+    since = to_starts_at(datetime.now() + min_lead)
+    after_starts_at, after_id = after or (since, 0)
+    async with get_pool().reader() as db:
+        async with db.execute(
             """
+            SELECT id, date, time, starts_at, duration, service, status, payment_status
+            FROM appointments
+            WHERE user_id = ? AND starts_at > ? AND status != 'отменена'
+              AND (starts_at, id) > (?, ?)
+            ORDER BY starts_at, id
+            LIMIT ?
+            """,
+            (user_id, since, after_starts_at, after_id, limit)
+        ) as cur:
+            return [dict(r) for r in await cur.fetchall()]
+
+_APPOINTMENT_COLUMNS = "id, user_id, service, date, time, starts_at, duration, status, payment_status"
+
+@timed
+async def cancel_by_id(appointment_id: int, user_id: int | None = None) -> Mutation:
+    """
+    Помечает запись отменённой. Если передан user_id — только запись этого пользователя.
+    """
+    async with get_pool().writer() as db:
+        async with db.execute(
+            f"""
             UPDATE appointments
             SET status = 'отменена'
-            WHERE user_id = ? AND date = ? AND time = ? AND status != 'отменена'
+            WHERE id = ? AND (? IS NULL OR user_id = ?) AND status != 'отменена'
+            RETURNING {_APPOINTMENT_COLUMNS}
             """,
-            (user_id, date, time)
-        )
-        await db.commit()
+            (appointment_id, user_id, user_id)
+        ) as cur:
+            row = await cur.fetchone()
+    if row is None:
+        return Mutation(0)
+    row = dict(row)
+    if row["starts_at"]:
+        availability.release(datetime.fromisoformat(row["starts_at"]))
+    await _appointment_changed(appointment_id)
+    return Mutation(1, row)
 
-async def update_appointment(
-    user_id: int,
-    old_date: str, old_time: str,
-    new_date: str, new_time: str
-):
+@timed
+async def reschedule_by_id(
+    appointment_id: int, new_start: datetime, user_id: int | None = None
+) -> Mutation:
     """
-    Переносит запись на новую дату/время.
+    Атомарно переносит запись на new_start, если новый интервал
+    той же длительности не пересекается с другими активными записями
+    и чужими временными бронями.
+    Mutation.slot_taken=True — слот занят; count=0 без slot_taken — запись не найдена.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
+    async with get_pool().writer() as db:
+        async with db.execute(
             """
-            UPDATE appointments
-            SET date = ?, time = ?
-            WHERE user_id = ? AND date = ? AND time = ? AND status != 'отменена'
+            SELECT starts_at, duration, user_id FROM appointments
+            WHERE id = ? AND (? IS NULL OR user_id = ?) AND status != 'отменена'
             """,
-            (new_date, new_time, user_id, old_date, old_time)
-        )
-        await db.commit()
+            (appointment_id, user_id, user_id)
+        ) as cur:
+            old = await cur.fetchone()
+        if old is None:
+            return Mutation(0)
+        old_starts_at, duration, owner_id = old
+        interval = _interval(new_start, duration)
+        try:
+            async with db.execute(
+                f"""
+                UPDATE appointments
+                SET date = ?, time = ?, starts_at = ?, ends_at = ?
+                WHERE id = ?
+                  AND NOT EXISTS ({_OVERLAP_SQL} AND other.id != appointments.id)
+                  AND NOT EXISTS ({_HOLD_OVERLAP_SQL})
+                RETURNING {_APPOINTMENT_COLUMNS}
+                """,
+                (*_display(new_start), interval[2], interval[1], appointment_id, *interval,
+                 _now(), owner_id, owner_id, *interval)
+            ) as cur:
+                row = await cur.fetchone()
+        except sqlite3.IntegrityError:
+            return SLOT_TAKEN_MUTATION
+        if row is None:
+            return SLOT_TAKEN_MUTATION
+    if old_starts_at:
+        availability.release(datetime.fromisoformat(old_starts_at))
+    availability.book(new_start, duration)
+    await _appointment_changed(appointment_id)
+    return Mutation(1, dict(row))
 
-async def confirm_payment(user_id: int, date: str, time: str):
+@timed
+async def confirm_by_id(appointment_id: int) -> Mutation:
     """
     Админ вызывает для подтверждения оплаты:
       payment_status = 'оплачено'
       status = 'подтверждена'
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            """
+    async with get_pool().writer() as db:
+        async with db.execute(
+            f"""
             UPDATE appointments
             SET payment_status = 'оплачено', status = 'подтверждена'
-            WHERE user_id = ? AND date = ? AND time = ? AND status != 'отменена'
+            WHERE id = ? AND status != 'отменена'
+            RETURNING {_APPOINTMENT_COLUMNS}
+            """,
+            (appointment_id,)
+        ) as cur:
+            row = await cur.fetchone()
+    if row is None:
+        return Mutation(0)
+    await _appointment_changed(appointment_id)
+    return Mutation(1, dict(row))
+
+@cached(query_cache)
+@timed
+async def get_unpaid_appointments(limit: int = 10, cursor: int = 0) -> list[dict]:
+    """
+    Неоплаченные активные записи с ID больше cursor, по возрастанию ID.
+    Читаются по частичному индексу idx_appointments_unpaid.
+    """
+    async with get_pool().reader() as db:
+        async with db.execute(
+            """
+            SELECT id, user_id, service, date, time, starts_at, status, payment_status
+            FROM appointments
+            WHERE payment_status = 'не оплачено' AND status != 'отменена' AND id > ?
+            ORDER BY id
+            LIMIT ?
             """,
-            (user_id, date, time)
+            (cursor, limit)
+        ) as cur:
+            return [dict(r) for r in await cur.fetchall()]
+
+@cached(query_cache)
+@timed
+async def get_appointment(appointment_id: int) -> dict | None:
+    """
+    Возвращает запись по ID или None.
+    """
+    async with get_pool().reader() as db:
+        cur = await db.execute(
+            """
+            SELECT id, user_id, service, date, time, starts_at, duration, status, payment_status
+            FROM appointments
+            WHERE id = ?
+            """,
+            (appointment_id,)
         )
-        await db.commit()
+        row = await cur.fetchone()
+        return dict(row) if row else None
 
+@cached(query_cache)
+@timed
 async def get_all_appointments() -> list[dict]:
     """
     Возвращает все ненулевые (не отменённые) записи для админа.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_pool().reader() as db:
         cur = await db.execute(
             """
-            SELECT id, user_id, service, date, time, status, payment_status
+            SELECT id, user_id, service, date, time, starts_at, status, payment_status
             FROM appointments
             WHERE status != 'отменена'
-            ORDER BY date, time
+            ORDER BY starts_at
             """
         )
         rows = await cur.fetchall()
         return [dict(r) for r in rows]
 
-async def get_appointments_by_range(start_date: str, end_date: str) -> list[dict]:
+@cached(query_cache)
+@timed
+async def get_appointments_by_range(start_date: date, end_date: date) -> list[dict]:
     """
     Возвращает ненулевые записи между start_date и end_date (включительно).
+    Диапазон сканируется по индексу на starts_at.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
+    async with get_pool().reader() as db:
         cur = await db.execute(
             """
-            SELECT id, user_id, service, date, time, status, payment_status
+            SELECT id, user_id, service, date, time, starts_at, status, payment_status
+            FROM appointments
+            WHERE status != 'отменена'
+              AND starts_at >= ? AND starts_at < ?
+            ORDER BY starts_at
+            """,
+            (start_date.isoformat(), (end_date + timedelta(days=1)).isoformat())
+        )
+        rows = await cur.fetchall()
+        return [dict(r) for r in rows]
+
+async def iter_appointments_by_range(
+    start_date: date,
+    end_date: date,
+    after: tuple[str, int] | None = None,
+    batch_size: int = 100,
+) -> AsyncIterator[dict]:
+    """
+    Как get_appointments_by_range, но отдаёт записи по одной, читая их из БД
+    порциями по batch_size (keyset по (starts_at, id)), — память не растёт
+    с размером диапазона. after — ключ записи, после которой начинать.
+    Соединение занимается только на время чтения очередной порции.
+    """
+    start, end = start_date.isoformat(), (end_date + timedelta(days=1)).isoformat()
+    after_starts_at, after_id = after or ("", 0)
+    while True:
+        rows = await _range_batch(start, end, after_starts_at, after_id, batch_size)
+        for row in rows:
+            yield row
+        if len(rows) < batch_size:
+            return
+        after_starts_at, after_id = rows[-1]["starts_at"], rows[-1]["id"]
+
+@cached(query_cache)
+@timed
+async def _range_batch(start: str, end: str, after_starts_at: str, after_id: int, limit: int) -> list[dict]:
+    async with get_pool().reader() as db:
+        async with db.execute(
+            """
+            SELECT id, user_id, service, date, time, starts_at, status, payment_status
             FROM appointments
             WHERE status != 'отменена'
-              AND date BETWEEN ? AND ?
-            ORDER BY date, time
+              AND starts_at >= ? AND starts_at < ?
+              AND (starts_at, id) > (?, ?)
+            ORDER BY starts_at, id
+            LIMIT ?
             """,
-            (start_date, end_date)
+            (start, end, after_starts_at, after_id, limit)
+        ) as cur:
+            return [dict(r) for r in await cur.fetchall()]
+
+async def _delete_holds(db, where: str, *params) -> list[int]:
+    async with db.execute(f"DELETE FROM slot_holds WHERE {where} RETURNING id", params) as cur:
+        return [row[0] for row in await cur.fetchall()]
+
+@timed
+async def hold_slot(user_id: int, starts_at: datetime, duration: int = DEFAULT_DURATION) -> Hold | None:
+    """
+    Закрепляет время за клиентом на SLOT_HOLD_MINUTES минут, пока он подтверждает запись.
+    Прежняя бронь клиента снимается. None — интервал занят записью или чужой бронью.
+    """
+    held_until = datetime.now().replace(microsecond=0) + timedelta(minutes=SLOT_HOLD_MINUTES)
+    interval = _interval(starts_at, duration)
+    async with get_pool().writer() as db:
+        released = await _delete_holds(db, "user_id = ?", user_id)
+        cursor = await db.execute(
+            f"""
+            INSERT INTO slot_holds (user_id, starts_at, duration, ends_at, held_until)
+            SELECT ?, ?, ?, ?, ?
+            WHERE NOT EXISTS ({_OVERLAP_SQL}) AND NOT EXISTS ({_HOLD_OVERLAP_SQL})
+            """,
+            (user_id, interval[2], duration, interval[1], held_until.isoformat(sep=" "),
+             *interval, _now(), user_id, user_id, *interval)
+        )
+    for hold_id in released:
+        availability.release_hold(hold_id)
+    if cursor.rowcount == 0:
+        return None
+    availability.hold(cursor.lastrowid, starts_at, duration, held_until)
+    return Hold(cursor.lastrowid, starts_at, duration, held_until)
+
+@timed
+async def release_holds(user_id: int):
+    """
+    Снимает временные брони клиента (вышел из записи или выбрал другое время).
+    """
+    async with get_pool().writer() as db:
+        released = await _delete_holds(db, "user_id = ?", user_id)
+    for hold_id in released:
+        availability.release_hold(hold_id)
+
+@timed
+async def sweep_expired_holds() -> int:
+    """
+    Удаляет истёкшие временные брони. Индекс свободных слотов снимает их
+    и сам при чтении, поэтому это только уборка таблицы. Возвращает число броней.
+    """
+    async with get_pool().writer() as db:
+        expired = await _delete_holds(db, "held_until <= ?", _now())
+    for hold_id in expired:
+        availability.release_hold(hold_id)
+    return len(expired)
+
+async def _set_schedule_exception(dt: datetime, is_available: bool):
+    async with get_pool().writer() as db:
+        await db.execute(
+            "INSERT OR REPLACE INTO availability_exceptions (day, time, is_available) VALUES (?, ?, ?)",
+            (dt.date().isoformat(), dt.strftime("%H:%M"), int(is_available))
+        )
+    query_cache.invalidate()
+    if is_available:
+        availability.add_slot(dt)
+    else:
+        availability.remove_slot(dt)
+
+@timed
+async def add_schedule_slot(dt: datetime):
+    """
+    Админ добавляет разовый слот в расписание (исключение из правил).
+    """
+    await _set_schedule_exception(dt, True)
+
+@timed
+async def remove_schedule_slot(dt: datetime):
+    """
+    Админ убирает разовый слот из расписания (исключение из правил).
+    """
+    await _set_schedule_exception(dt, False)
+
+@timed
+async def add_schedule_rule(
+    weekdays: int,
+    start_time: str,
+    end_time: str,
+    date_from: date,
+    date_to: date | None,
+    is_open: bool = True,
+    step: int = 60,
+) -> dict[date, int]:
+    """
+    Открывает (is_open=True) или закрывает слоты с start_time до end_time
+    с шагом step минут в дни недели из weekdays с date_from по date_to —
+    одной строкой availability_rules вместо строки на каждый слот.
+    Новое правило перекрывает прежние правила и исключения в своих слотах.
+    Возвращает {день: число открытых/закрытых слотов} по изменившимся дням.
+    """
+    async with get_pool().writer() as db:
+        cursor = await db.execute(
+            """
+            INSERT INTO availability_rules
+                (weekdays, start_time, end_time, step, date_from, date_to, is_open)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (weekdays, start_time, end_time, step, date_from.isoformat(),
+             date_to.isoformat() if date_to else None, int(is_open))
+        )
+        rule = Rule(
+            cursor.lastrowid, weekdays, parse_hhmm(start_time), parse_hhmm(end_time), step,
+            date_from, date_to, is_open
+        )
+        async with db.execute(
+            "SELECT day, time FROM availability_exceptions WHERE day >= ? AND (? IS NULL OR day <= ?)",
+            (rule.date_from.isoformat(), *(2 * [date_to.isoformat() if date_to else None]))
+        ) as cur:
+            covered = [
+                (day, time) for day, time in await cur.fetchall()
+                if rule.produces(datetime.fromisoformat(f"{day} {time}"))
+            ]
+        await db.executemany(
+            "DELETE FROM availability_exceptions WHERE day = ? AND time = ?", covered
+        )
+    query_cache.invalidate()
+    return availability.add_rule(rule)
+
+@timed
+async def replace_reminders(appointment_id: int, reminders: list[tuple[str, int, datetime]]) -> list[dict]:
+    """
+    Заменяет неотправленные напоминания записи новым набором
+    (type, chat_id, due_at) одной транзакцией.
+    Возвращает созданные строки: [{'id', 'due_at'}].
+    """
+    async with get_pool().writer() as db:
+        await db.execute(
+            "DELETE FROM notifications WHERE appointment_id = ? AND sent_at IS NULL",
+            (appointment_id,)
+        )
+        created = []
+        for kind, chat_id, due_at in reminders:
+            cursor = await db.execute(
+                """
+                INSERT INTO notifications (appointment_id, type, chat_id, due_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                (appointment_id, kind, chat_id, to_starts_at(due_at))
+            )
+            created.append({"id": cursor.lastrowid, "due_at": to_starts_at(due_at)})
+        return created
+
+@timed
+async def get_appointments_without_reminders(after: datetime) -> list[dict]:
+    """
+    Оплаченные активные записи после after, для которых ещё нет ни одного
+    напоминания (например, созданные до появления таблицы напоминаний).
+    """
+    async with get_pool().reader() as db:
+        cur = await db.execute(
+            """
+            SELECT a.id, a.user_id, a.service, a.date, a.time, a.starts_at,
+                   a.status, a.payment_status
+            FROM appointments AS a
+            WHERE a.status != 'отменена' AND a.payment_status = 'оплачено'
+              AND a.starts_at > ?
+              AND NOT EXISTS (SELECT 1 FROM notifications AS n WHERE n.appointment_id = a.id)
+            """,
+            (to_starts_at(after),)
+        )
+        rows = await cur.fetchall()
+        return [dict(r) for r in rows]
+
+@timed
+async def get_pending_reminders(since: datetime, until: datetime, limit: int, max_attempts: int) -> list[dict]:
+    """
+    Неотправленные напоминания со временем отправки в [since, until],
+    у которых ещё остались попытки, по возрастанию времени, не больше limit штук:
+    [{'id', 'due_at', 'claimed_at', 'not_before'}]. claimed_at не пуст, если
+    напоминание уже кто-то взял в отправку (см. claim_reminders), not_before —
+    если прошлая отправка не удалась и повтор отложен (см. release_reminders).
+    """
+    async with get_pool().reader() as db:
+        cur = await db.execute(
+            """
+            SELECT id, due_at, claimed_at, not_before FROM notifications
+            WHERE sent_at IS NULL AND due_at >= ? AND due_at <= ? AND attempts < ?
+            ORDER BY due_at
+            LIMIT ?
+            """,
+            (to_starts_at(since), to_starts_at(until), max_attempts, limit)
         )
         rows = await cur.fetchall()
         return [dict(r) for r in rows]
 
-async def add_schedule_slot(date: str, time: str):
+@timed
+async def claim_reminders(reminder_ids: list[int], lease: timedelta, max_attempts: int) -> list[dict]:
+    """
+    Атомарно берёт напоминания в отправку на время lease и возвращает взятые
+    вместе с данными записи. Берутся только неотправленные, с оставшимися
+    попытками и не взятые никем другим (или взятые раньше чем lease назад —
+    отправитель упал, не успев отчитаться).
+    sent_at ставит mark_reminders_sent после доставки, release_reminders
+    возвращает недоставленные в очередь.
+    """
+    if not reminder_ids:
+        return []
+    now = datetime.now().replace(microsecond=0)
+    placeholders = ",".join("?" * len(reminder_ids))
+    async with get_pool().writer() as db:
+        async with db.execute(
+            f"""
+            UPDATE notifications SET claimed_at = ?, attempts = attempts + 1
+            WHERE id IN ({placeholders}) AND sent_at IS NULL AND attempts < ?
+              AND (claimed_at IS NULL OR claimed_at <= ?)
+            RETURNING id
+            """,
+            (now.isoformat(sep=" "), *reminder_ids, max_attempts, (now - lease).isoformat(sep=" "))
+        ) as cur:
+            claimed = [row[0] for row in await cur.fetchall()]
+        if not claimed:
+            return []
+        placeholders = ",".join("?" * len(claimed))
+        async with db.execute(
+            f"""
+            SELECT n.id, n.type, n.chat_id, n.due_at, n.attempts,
+                   a.id AS appointment_id, a.user_id, a.service, a.starts_at
+            FROM notifications AS n
+            JOIN appointments AS a ON a.id = n.appointment_id
+            WHERE n.id IN ({placeholders})
+            ORDER BY n.due_at
+            """,
+            claimed
+        ) as cur:
+            return [dict(r) for r in await cur.fetchall()]
+
+@timed
+async def mark_reminders_sent(reminder_ids: list[int]):
     """
-    Админ добавляет слот в расписание.
+    Отмечает доставленные напоминания. Повторно они больше не берутся.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
+    if not reminder_ids:
+        return
+    async with get_pool().writer() as db:
         await db.execute(
-            "INSERT OR IGNORE INTO schedule (date, time) VALUES (?, ?)",
-            (date, time)
+            f"UPDATE notifications SET sent_at = ? WHERE id IN ({','.join('?' * len(reminder_ids))})",
+            (_now(), *reminder_ids)
         )
-        await db.commit()
 
-async def remove_schedule_slot(date: str, time: str):
+@timed
+async def release_reminders(reminder_ids: list[int], retry_at: datetime):
     """
-    Админ удаляет слот из расписания.
+    Снимает аренду с недоставленных напоминаний, чтобы их можно было взять
+    снова, но не раньше retry_at (not_before переживает перезагрузку очереди
+    и перезапуск).
     """
-    async with aiosqlite.connect(DB_PATH) as db:
+    if not reminder_ids:
+        return
+    async with get_pool().writer() as db:
         await db.execute(
-            "DELETE FROM schedule WHERE date = ? AND time = ?",
-            (date, time)
+            f"""
+            UPDATE notifications SET claimed_at = NULL, not_before = ?
+            WHERE id IN ({','.join('?' * len(reminder_ids))}) AND sent_at IS NULL
+            """,
+            (retry_at.isoformat(sep=" ", timespec="seconds"), *reminder_ids)
+        )
+
+
+# --- каталог услуг ------------------------------------------------------------
+
+@timed
+async def get_active_services() -> list[dict]:
+    """
+    Активные услуги в порядке показа. Читается только при (пере)загрузке
+    каталога — хэндлеры работают с services.catalog.
+    """
+    async with get_pool().reader() as db:
+        async with db.execute(
+            """
+            SELECT id, name, description, duration, price, audience
+            FROM services
+            WHERE is_active = 1
+            ORDER BY position, id
+            """
+        ) as cur:
+            return [dict(r) for r in await cur.fetchall()]
+
+
+@timed
+async def set_service_price(service_id: int, price: int) -> bool:
+    """
+    Меняет цену активной услуги. После успешного изменения
+    каталог нужно перечитать через reload_catalog().
+    """
+    async with get_pool().writer() as db:
+        cursor = await db.execute(
+            "UPDATE services SET price = ? WHERE id = ? AND is_active = 1",
+            (price, service_id)
         )
-        await db.commit()
+        return cursor.rowcount > 0
@@ -0,0 +1,38 @@
+# tests/__init__.py
+"""
+Тесты запускаются из корня проекта:
+    python -m unittest discover -t . -s tests
+Окружение задаётся до импорта config: временная БД и свои админы.
+"""
+
+import glob
+import os
+import tempfile
+import unittest
+
+_tmpdir = tempfile.TemporaryDirectory(prefix="massage-bot-tests-")
+os.environ["DB_NAME"] = os.path.join(_tmpdir.name, "test.db")
+os.environ.setdefault("MASSAGE_THERAPIST_ID", "999")
+
+from config import DB_PATH  # noqa: E402
+from database.db import init_db  # noqa: E402
+from database.pool import open_pool, close_pool  # noqa: E402
+from services.storage import load_availability, query_cache  # noqa: E402
+
+
+class DatabaseTestCase(unittest.IsolatedAsyncioTestCase):
+    """
+    Каждый тест получает чистую БД (init_db со всеми миграциями),
+    открытый пул соединений и индекс свободных слотов, построенный по ней.
+    """
+
+    async def asyncSetUp(self):
+        for path in glob.glob(f"{DB_PATH}*"):
+            os.remove(path)
+        query_cache.invalidate()
+        await init_db()
+        await open_pool()
+        await load_availability()
+
+    async def asyncTearDown(self):
+        await close_pool()
@@ -0,0 +1,116 @@
+# tests/test_booking.py
+
+import asyncio
+import itertools
+import time
+from datetime import datetime, timedelta
+
+from aiogram import Dispatcher
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.methods import AnswerCallbackQuery
+from aiogram.types import Update
+
+from benchmarks.fake_bot import FakeBot
+from database.pool import get_pool
+from handlers.booking import BookingStates, router as booking_router
+from keyboards.calendar import CalendarCallback
+from middlewares.concurrency import ChatIsolation, setup_concurrency
+from services.availability import availability
+from services.storage import hold_slot
+from tests import DatabaseTestCase
+
+_ids = itertools.count(1)
+_dp = Dispatcher(storage=MemoryStorage(), events_isolation=ChatIsolation())
+setup_concurrency(_dp)
+_dp.include_router(booking_router)
+
+
+def _callback(user_id: int, data: str) -> Update:
+    return Update.model_validate({
+        "update_id": next(_ids),
+        "callback_query": {
+            "id": str(next(_ids)),
+            "chat_instance": "test",
+            "data": data,
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+            "message": {
+                "message_id": next(_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "text": "calendar",
+            },
+        },
+    })
+
+
+class StaleCalendarTest(DatabaseTestCase):
+    """Время из календаря, открытого раньше, может уже пройти."""
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.bot = FakeBot(global_limit=None, per_chat_limit=None)
+        self.user_id = next(_ids)
+        self.state = _dp.fsm.get_context(
+            self.bot, chat_id=self.user_id, user_id=self.user_id
+        )
+        await self.state.set_state(BookingStates.choosing_datetime)
+        await self.state.update_data(service="Массаж — 60 мин", duration=60)
+
+    async def _holds(self) -> int:
+        async with get_pool().reader() as db:
+            async with db.execute("SELECT COUNT(*) FROM slot_holds") as cur:
+                return (await cur.fetchone())[0]
+
+    async def test_past_slot_is_not_held(self):
+        past = (datetime.now() - timedelta(hours=2)).replace(minute=0, second=0, microsecond=0)
+        data = CalendarCallback(
+            action="time", year=past.year, month=past.month, day=past.day, minute=past.hour * 60
+        ).pack()
+
+        await _dp.feed_update(self.bot, _callback(self.user_id, data))
+
+        answer, = [m for m in self.bot.fake_session.requests if isinstance(m, AnswerCallbackQuery)]
+        self.assertIn("уже прошло", answer.text)
+        self.assertEqual(await self._holds(), 0)
+        self.assertEqual(await self.state.get_state(), BookingStates.choosing_datetime.state)
+
+    async def test_confirm_after_start_is_not_booked(self):
+        started = (datetime.now() - timedelta(minutes=5)).replace(second=0, microsecond=0)
+        await self.state.set_state(BookingStates.confirming)
+        await self.state.update_data(held_at=started.strftime("%Y-%m-%d %H:%M"))
+
+        await _dp.feed_update(self.bot, _callback(self.user_id, CalendarCallback(action="confirm").pack()))
+
+        self.assertIn("уже прошло", self.bot.fake_session.sent_messages[-1].text)
+        async with get_pool().reader() as db:
+            async with db.execute("SELECT COUNT(*) FROM appointments") as cur:
+                self.assertEqual((await cur.fetchone())[0], 0)
+        self.assertEqual(await self.state.get_state(), BookingStates.choosing_datetime.state)
+
+
+class DoubleTapTest(DatabaseTestCase):
+    """Повторное нажатие кнопки должно выбирать хэндлер по состоянию после первого."""
+
+    async def test_double_confirm_books_once(self):
+        bot = FakeBot(global_limit=None, per_chat_limit=None)
+        user_id = next(_ids)
+        state = _dp.fsm.get_context(bot, chat_id=user_id, user_id=user_id)
+        slot, = availability.next_free(1, after=datetime.now() + timedelta(days=1))
+        await hold_slot(user_id, slot)
+        await state.set_state(BookingStates.confirming)
+        await state.update_data(service="Массаж — 60 мин", duration=60, held_at=slot.strftime("%Y-%m-%d %H:%M"))
+
+        confirm = CalendarCallback(action="confirm").pack()
+        await asyncio.gather(*(_dp.feed_update(bot, _callback(user_id, confirm)) for _ in range(2)))
+
+        self.assertEqual(
+            [m.text for m in bot.fake_session.sent_messages if m.text.startswith("✅")],
+            [bot.fake_session.sent_messages[0].text],
+        )
+        self.assertTrue(bot.fake_session.sent_messages[0].text.startswith("✅ Ваша заявка принята"))
+        answers = [m.text for m in bot.fake_session.requests if isinstance(m, AnswerCallbackQuery)]
+        self.assertIn("Календарь устарел, начните запись заново.", answers)
+        self.assertIsNone(await state.get_state())
+        async with get_pool().reader() as db:
+            async with db.execute("SELECT COUNT(*) FROM appointments") as cur:
+                self.assertEqual((await cur.fetchone())[0], 1)
@@ -0,0 +1,12 @@
+# tests/test_catalog.py
+
+import unittest
+
+from services.catalog import Service
+
+
+class ServiceTitleTest(unittest.TestCase):
+
+    def test_price_grouping_keeps_name(self):
+        service = Service(id=1, name="Массаж спины, шеи", duration=60, price=2500, audience="all")
+        self.assertEqual(service.title, "Массаж спины, шеи — 60 мин — 2 500₽")
@@ -0,0 +1,82 @@
+# tests/test_concurrency.py
+
+import asyncio
+import itertools
+import time
+import unittest
+
+from aiogram import Dispatcher, Router
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Message, Update
+
+from benchmarks.fake_bot import FakeBot
+from middlewares.concurrency import ChatIsolation, setup_concurrency
+
+_ids = itertools.count(1)
+
+
+def _message(chat_id: int, text: str) -> Update:
+    return Update.model_validate({
+        "update_id": next(_ids),
+        "message": {
+            "message_id": next(_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    })
+
+
+class ConcurrencyTest(unittest.IsolatedAsyncioTestCase):
+
+    def _dispatcher(self, max_pending: int = 5, **limits) -> tuple[Dispatcher, ChatIsolation, list]:
+        self.isolation = ChatIsolation(max_pending)
+        dp = Dispatcher(storage=MemoryStorage(), events_isolation=self.isolation)
+        setup_concurrency(dp, **limits)
+        log = []
+        self.active = self.peak = 0
+        router = Router()
+
+        @router.message()
+        async def handle(message: Message, state: FSMContext, raw_state: str | None):
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            log.append((message.chat.id, message.text, raw_state))
+            await asyncio.sleep(0.05)
+            await state.set_state(f"after:{message.text}")
+            self.active -= 1
+
+        dp.include_router(router)
+        return dp, self.isolation, log
+
+    async def test_same_chat_runs_in_order_on_fresh_state(self):
+        dp, isolation, log = self._dispatcher()
+        bot = FakeBot()
+
+        await asyncio.gather(*(dp.feed_update(bot, _message(1, str(i))) for i in range(3)))
+
+        self.assertEqual(log, [(1, "0", None), (1, "1", "after:0"), (1, "2", "after:1")])
+        self.assertEqual(isolation._locks, {})
+
+    async def test_chat_flood_is_shed(self):
+        dp, isolation, log = self._dispatcher(max_pending=2)
+        bot = FakeBot()
+
+        with self.assertLogs("middlewares.concurrency", level="WARNING"):
+            await asyncio.gather(*(dp.feed_update(bot, _message(1, str(i))) for i in range(4)))
+
+        self.assertEqual([text for _, text, _ in log], ["0", "1"])
+        self.assertEqual(isolation._locks, {})
+
+    async def test_global_limit_and_overload(self):
+        dp, _, log = self._dispatcher(max_in_flight=2, max_queued=3)
+        bot = FakeBot()
+
+        with self.assertLogs("middlewares.concurrency", level="WARNING") as logs:
+            await asyncio.gather(*(dp.feed_update(bot, _message(chat, "x")) for chat in range(1, 8)))
+
+        self.assertEqual(self.peak, 2)
+        self.assertEqual(len(log), 5)
+        self.assertEqual(len(logs.output), 2)
@@ -0,0 +1,50 @@
+# tests/test_fsm_storage.py
+
+from aiogram.fsm.storage.base import StorageKey
+
+from database.pool import get_pool
+from services.fsm_storage import SQLiteStorage
+from tests import DatabaseTestCase
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+
+
+class SQLiteStorageTest(DatabaseTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.storage = SQLiteStorage(ttl=60)
+        await self.storage.set_state(KEY, "Booking:confirming")
+        await self.storage.set_data(KEY, {"held_at": "2027-01-12 14:00"})
+
+    async def _expire(self):
+        # строка устарела, но фоновая очистка до неё ещё не дошла
+        async with get_pool().writer() as db:
+            await db.execute("UPDATE fsm_state SET updated_at = updated_at - 3600")
+
+    async def test_round_trip(self):
+        self.assertEqual(await self.storage.get_state(KEY), "Booking:confirming")
+        self.assertEqual(await self.storage.update_data(KEY, {"duration": 60}),
+                         {"held_at": "2027-01-12 14:00", "duration": 60})
+
+    async def test_set_state_on_expired_row_drops_old_data(self):
+        await self._expire()
+
+        await self.storage.set_state(KEY, "Booking:choosing_gender")
+
+        self.assertEqual(await self.storage.get_state(KEY), "Booking:choosing_gender")
+        self.assertEqual(await self.storage.get_data(KEY), {})
+
+    async def test_update_data_on_expired_row_drops_old_state(self):
+        await self._expire()
+
+        self.assertEqual(await self.storage.update_data(KEY, {"duration": 40}), {"duration": 40})
+
+        self.assertIsNone(await self.storage.get_state(KEY))
+        self.assertEqual(await self.storage.get_data(KEY), {"duration": 40})
+
+    async def test_evict_stale(self):
+        await self._expire()
+
+        self.assertEqual(await self.storage.evict_stale(), 1)
+        self.assertEqual(await self.storage.get_data(KEY), {})
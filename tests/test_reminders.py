@@ -0,0 +1,105 @@
+# tests/test_reminders.py
+
+from datetime import datetime, timedelta
+
+from benchmarks.fake_bot import FakeBot
+from database.pool import get_pool
+from notifications import ReminderDispatcher
+from services.availability import availability
+from services.sender import sender
+from services.storage import (
+    claim_reminders, get_pending_reminders, mark_reminders_sent, release_reminders,
+    replace_reminders, reserve_slot,
+)
+from tests import DatabaseTestCase
+
+LEASE = timedelta(minutes=10)
+
+
+class ReminderDeliveryTest(DatabaseTestCase):
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        slot, = availability.next_free(1, after=datetime.now() + timedelta(days=2))
+        reservation = await reserve_slot({"user_id": 42, "service": "Массаж", "starts_at": slot})
+        self.due_at = datetime.now().replace(second=0, microsecond=0)
+        rem, = await replace_reminders(reservation.appointment_id, [("client_hour", 42, self.due_at)])
+        self.reminder_id = rem["id"]
+
+    async def asyncTearDown(self):
+        await sender.stop()
+        await super().asyncTearDown()
+
+    async def _row(self) -> dict:
+        async with get_pool().reader() as db:
+            async with db.execute(
+                "SELECT sent_at, claimed_at, attempts FROM notifications WHERE id = ?", (self.reminder_id,)
+            ) as cur:
+                return dict(await cur.fetchone())
+
+    async def _pending(self, max_attempts: int = 3) -> list[int]:
+        rows = await get_pending_reminders(
+            self.due_at - timedelta(minutes=1), self.due_at + timedelta(minutes=1), 10, max_attempts
+        )
+        return [r["id"] for r in rows]
+
+    async def test_sent_only_after_delivery(self):
+        claimed = await claim_reminders([self.reminder_id], LEASE, 3)
+        self.assertEqual([r["id"] for r in claimed], [self.reminder_id])
+        self.assertIsNone((await self._row())["sent_at"])
+
+        await mark_reminders_sent([self.reminder_id])
+
+        self.assertIsNotNone((await self._row())["sent_at"])
+        self.assertEqual(await claim_reminders([self.reminder_id], timedelta(0), 3), [])
+        self.assertEqual(await self._pending(), [])
+
+    async def test_lease_blocks_second_claim_until_it_expires(self):
+        await claim_reminders([self.reminder_id], LEASE, 3)
+
+        self.assertEqual(await claim_reminders([self.reminder_id], LEASE, 3), [])
+        # отправитель упал, не отчитавшись: после аренды напоминание берётся снова
+        reclaimed = await claim_reminders([self.reminder_id], timedelta(0), 3)
+        self.assertEqual([r["attempts"] for r in reclaimed], [2])
+
+    async def test_release_and_attempt_limit(self):
+        for attempt in (1, 2):
+            claimed, = await claim_reminders([self.reminder_id], LEASE, 2)
+            self.assertEqual(claimed["attempts"], attempt)
+            await release_reminders([self.reminder_id], datetime.now())
+
+        self.assertEqual(await claim_reminders([self.reminder_id], LEASE, 2), [])
+        self.assertEqual(await self._pending(max_attempts=2), [])
+        self.assertEqual(await self._pending(max_attempts=3), [self.reminder_id])
+
+    async def test_dispatcher_marks_delivered(self):
+        bot = FakeBot()
+        sender.start(bot)
+
+        await ReminderDispatcher()._dispatch([self.reminder_id])
+
+        self.assertIsNotNone((await self._row())["sent_at"])
+        self.assertEqual([m.chat_id for m in bot.fake_session.sent_messages], [42])
+
+    async def test_dispatcher_requeues_failed_delivery(self):
+        # global_limit=0: каждый запрос получает 429, отправитель сдаётся
+        sender.start(FakeBot(global_limit=0, retry_after=0))
+        dispatcher = ReminderDispatcher()
+
+        with self.assertLogs("notifications.dead_letter", level="ERROR"):
+            await dispatcher._dispatch([self.reminder_id])
+
+        self.assertEqual(await self._row(), {"sent_at": None, "claimed_at": None, "attempts": 1})
+        self.assertEqual([rem_id for _, rem_id in dispatcher._heap], [self.reminder_id])
+
+    async def test_retry_delay_survives_refill(self):
+        sender.start(FakeBot(global_limit=0, retry_after=0))
+        dispatcher = ReminderDispatcher()
+
+        with self.assertLogs("notifications.dead_letter", level="ERROR"):
+            await dispatcher._dispatch([self.reminder_id])
+        (retry_at, _), = dispatcher._heap
+        await dispatcher._refill(datetime.now())
+
+        self.assertEqual(dispatcher._heap, [(retry_at.replace(microsecond=0), self.reminder_id)])
+        self.assertGreater(retry_at, datetime.now())
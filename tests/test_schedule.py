@@ -0,0 +1,34 @@
+# tests/test_schedule.py
+
+import unittest
+from datetime import date, datetime
+
+from services.schedule import ALL_WEEKDAYS, Rule, Schedule, parse_hhmm
+
+MONDAY = date(2030, 1, 7)
+
+
+def _rule(rule_id: int, start: str, end: str, date_to: date, is_open: bool = True) -> Rule:
+    return Rule(rule_id, ALL_WEEKDAYS, parse_hhmm(start), parse_hhmm(end), 60, MONDAY, date_to, is_open)
+
+
+class AddRuleTest(unittest.TestCase):
+
+    def test_reports_changed_days_and_slots(self):
+        schedule = Schedule([_rule(1, "12:00", "15:00", date(2030, 1, 8))])
+
+        changes = schedule.add_rule(_rule(2, "14:00", "16:00", date(2030, 1, 9)))
+
+        # 14:00 уже был открыт, новый только 15:00; в среду открываются оба
+        self.assertEqual(changes, {date(2030, 1, 7): 1, date(2030, 1, 8): 1, date(2030, 1, 9): 2})
+
+    def test_closing_counts_removed_slots_and_exceptions(self):
+        schedule = Schedule(
+            [_rule(1, "12:00", "15:00", date(2030, 1, 8))],
+            [(datetime(2030, 1, 9, 10, 0), True)],
+        )
+
+        changes = schedule.add_rule(_rule(2, "00:00", "23:00", date(2030, 1, 10), is_open=False))
+
+        self.assertEqual(changes, {date(2030, 1, 7): 3, date(2030, 1, 8): 3, date(2030, 1, 9): 1})
+        self.assertEqual(list(schedule.days(MONDAY, date(2030, 1, 10))), [])
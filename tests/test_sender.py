@@ -0,0 +1,103 @@
+# tests/test_sender.py
+
+import asyncio
+import time
+import unittest
+
+from benchmarks.fake_bot import FakeBot
+from services.sender import MessageSender, TokenBucket
+
+
+class TokenBucketTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_burst_then_rate(self):
+        bucket = TokenBucket(rate=10, capacity=3)
+        self.assertEqual([bucket.try_acquire() for _ in range(4)], [True, True, True, False])
+        self.assertAlmostEqual(bucket.delay(), 0.1, delta=0.02)
+
+        started = time.monotonic()
+        await bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.08)
+
+    async def test_pause(self):
+        bucket = TokenBucket(rate=100)
+        bucket.pause(0.2)
+        self.assertFalse(bucket.try_acquire())
+        self.assertGreater(bucket.delay(), 0.15)
+
+        started = time.monotonic()
+        await bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+
+class MessageSenderTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.senders: list[MessageSender] = []
+
+    async def asyncTearDown(self):
+        for sender in self.senders:
+            await sender.stop()
+
+    def _start(self, bot: FakeBot, **kwargs) -> MessageSender:
+        sender = MessageSender(**kwargs)
+        sender.start(bot)
+        self.senders.append(sender)
+        return sender
+
+    async def test_per_chat_order_within_limits(self):
+        bot = FakeBot(global_limit=30, per_chat_limit=5)
+        sender = self._start(bot, per_chat_rate=5)
+
+        results = await asyncio.gather(*(sender.send(chat, f"{chat}:{i}") for i in range(4) for chat in (1, 2)))
+
+        self.assertTrue(all(results))
+        self.assertEqual(bot.fake_session.flood_errors, 0)
+        for chat in (1, 2):
+            texts = [m.text for m in bot.fake_session.sent_messages if m.chat_id == chat]
+            self.assertEqual(texts, [f"{chat}:{i}" for i in range(4)])
+
+    async def test_hot_chat_does_not_block_others(self):
+        # как копии утренних напоминаний админу: много сообщений в один чат
+        bot = FakeBot(global_limit=None, per_chat_limit=None)
+        sender = self._start(bot, per_chat_rate=5, concurrency=2)
+        finished: dict[int, float] = {}
+
+        async def send(chat: int, text: str):
+            await sender.send(chat, text)
+            finished[chat] = time.monotonic()
+
+        started = time.monotonic()
+        await asyncio.gather(
+            *(send(999, f"admin:{i}") for i in range(12)),
+            *(send(chat, "reminder") for chat in range(1, 11)),
+        )
+
+        clients = max(finished[chat] for chat in range(1, 11)) - started
+        self.assertLess(clients, 0.5)
+        self.assertGreater(finished[999] - started, 1.2)
+
+    async def test_retry_after_pauses_and_redelivers(self):
+        bot = FakeBot(global_limit=2, per_chat_limit=None, retry_after=1)
+        sender = self._start(bot, global_rate=100, global_burst=10, per_chat_rate=100)
+
+        started = time.monotonic()
+        results = await asyncio.gather(*(sender.send(chat, "hi") for chat in (1, 2, 3)))
+
+        self.assertEqual(results, [True, True, True])
+        self.assertGreaterEqual(bot.fake_session.flood_errors, 1)
+        self.assertGreaterEqual(time.monotonic() - started, 1.0)
+        self.assertEqual(sorted(m.chat_id for m in bot.fake_session.sent_messages), [1, 2, 3])
+
+    async def test_dead_letter_after_max_attempts(self):
+        # global_limit=0: каждый запрос получает 429
+        bot = FakeBot(global_limit=0, retry_after=0)
+        sender = self._start(bot, max_attempts=3)
+
+        with self.assertLogs("notifications.dead_letter", level="ERROR") as logs:
+            delivered = await sender.send(1, "never")
+
+        self.assertFalse(delivered)
+        self.assertEqual(bot.fake_session.flood_errors, 3)
+        self.assertIn("попыток: 3", logs.output[0])
+        self.assertEqual(bot.fake_session.sent_messages, [])
@@ -0,0 +1,38 @@
+# tests/test_utils.py
+
+import unittest
+from datetime import date, datetime
+from unittest.mock import patch
+
+import utils
+
+
+def _today(day: date):
+    class FakeDate(date):
+        @classmethod
+        def today(cls):
+            return day
+    return patch.object(utils, "date", FakeDate)
+
+
+class ParseRussianDatetimeTest(unittest.TestCase):
+
+    def test_explicit_year(self):
+        with _today(date(2026, 12, 20)):
+            self.assertEqual(utils.parse_russian_datetime("12 января 2026 14:00"), datetime(2026, 1, 12, 14, 0))
+
+    def test_january_typed_in_december_is_next_year(self):
+        with _today(date(2026, 12, 20)):
+            self.assertEqual(utils.parse_russian_datetime("12 января 14:00"), datetime(2027, 1, 12, 14, 0))
+
+    def test_december_typed_in_january_is_last_year(self):
+        with _today(date(2027, 1, 2)):
+            self.assertEqual(utils.parse_russian_datetime("31 декабря 10:00"), datetime(2026, 12, 31, 10, 0))
+
+    def test_recent_past_stays_in_current_year(self):
+        with _today(date(2026, 10, 18)):
+            self.assertEqual(utils.parse_russian_datetime("17 октября 14:00"), datetime(2026, 10, 17, 14, 0))
+
+    def test_bad_month(self):
+        with self.assertRaises(ValueError):
+            utils.parse_russian_datetime("12 смарта 14:00")
@@ -0,0 +1,80 @@
+# tests/test_year_boundary.py
+
+from datetime import date, datetime, timedelta
+
+from database.pool import get_pool
+from services.availability import availability
+from services.storage import (
+    add_schedule_slot, get_appointment, get_upcoming_user_appointments, hold_slot, is_slot_taken,
+    remove_schedule_slot, reschedule_by_id, reserve_slot,
+)
+from tests import DatabaseTestCase
+
+
+def _next_year_slot() -> datetime:
+    """Первый вторник января следующего года, 14:00 — слот правила по умолчанию."""
+    day = date(date.today().year + 1, 1, 1)
+    while day.weekday() != 1:
+        day += timedelta(days=1)
+    return datetime(day.year, day.month, day.day, 14, 0)
+
+
+class YearBoundaryTest(DatabaseTestCase):
+    """Записи на январь следующего года не должны «съезжать» в текущий год."""
+
+    async def test_reserve_next_year(self):
+        slot = _next_year_slot()
+        self.assertTrue(availability.is_free(slot))
+
+        reservation = await reserve_slot({"user_id": 1, "service": "Массаж", "starts_at": slot})
+
+        self.assertTrue(reservation.ok)
+        record = await get_appointment(reservation.appointment_id)
+        self.assertEqual(record["starts_at"], slot.strftime("%Y-%m-%d %H:%M"))
+        upcoming = await get_upcoming_user_appointments(1)
+        self.assertEqual([r["id"] for r in upcoming], [reservation.appointment_id])
+        self.assertTrue(availability.is_busy(slot))
+        self.assertFalse(availability.is_busy(slot.replace(year=slot.year - 1)))
+
+    async def test_hold_next_year(self):
+        slot = _next_year_slot()
+
+        hold = await hold_slot(1, slot)
+
+        self.assertIsNotNone(hold)
+        self.assertEqual(hold.starts_at, slot)
+        self.assertIsNone(await hold_slot(2, slot))
+        self.assertIsNotNone(await hold_slot(2, slot.replace(year=slot.year - 1)))
+
+    async def test_reschedule_into_next_year(self):
+        first, = availability.next_free(1, after=datetime.now() + timedelta(days=2))
+        reservation = await reserve_slot({"user_id": 1, "service": "Массаж", "starts_at": first})
+        slot = _next_year_slot()
+
+        result = await reschedule_by_id(reservation.appointment_id, slot, user_id=1)
+
+        self.assertTrue(result.ok)
+        self.assertEqual(result.row["starts_at"], slot.strftime("%Y-%m-%d %H:%M"))
+        self.assertTrue(availability.is_busy(slot))
+        self.assertFalse(availability.is_busy(first))
+
+    async def test_slot_taken_next_year(self):
+        slot = _next_year_slot()
+        await reserve_slot({"user_id": 1, "service": "Массаж", "starts_at": slot})
+
+        self.assertTrue(await is_slot_taken(slot))
+        self.assertFalse(await is_slot_taken(slot.replace(year=slot.year - 1)))
+
+    async def test_schedule_exceptions_next_year(self):
+        slot = _next_year_slot()
+        extra = slot.replace(hour=10)
+
+        await add_schedule_slot(extra)
+        await remove_schedule_slot(slot)
+
+        self.assertTrue(availability.is_free(extra))
+        self.assertFalse(availability.is_free(slot))
+        async with get_pool().reader() as db:
+            async with db.execute("SELECT day, time, is_available FROM availability_exceptions ORDER BY time") as cur:
+                rows = [tuple(r) for r in await cur.fetchall()]
+        self.assertEqual(rows, [(extra.date().isoformat(), "10:00", 1), (slot.date().isoformat(), "14:00", 0)])
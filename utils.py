@@ -1,4 +1,7 @@
-from datetime import datetime
+import re
+from datetime import date, datetime
+from functools import lru_cache
+from typing import Iterable, Mapping
 from aiogram.types import Message
 
 # Маппинг русских названий месяцев
@@ -8,28 +11,116 @@ _MONTHS = {
     "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12,
 }
 
-def parse_russian_datetime(text: str) -> datetime:
+# Старые даты писались через strftime('%d %B'), то есть в локали процесса (C/POSIX)
+_LEGACY_MONTHS = {
+    "january": 1, "february": 2, "march": 3, "april": 4,
+    "may": 5, "june": 6, "july": 7, "august": 8,
+    "september": 9, "october": 10, "november": 11, "december": 12,
+}
+
+_MONTH_NAMES = {number: name for name, number in _MONTHS.items()}
+
+def format_russian_date(d: date) -> str:
     """
-    Принимает "31 мая 14:00" или "31 мая 2025 14:00".
-    Возвращает datetime.
+    date -> "31 мая". Не зависит от локали; в таком виде даты хранятся в БД.
     """
-    parts = text.strip().split()
-    if len(parts) == 3:
-        day, month_str, time_str = parts
-        year = datetime.now().year
-    elif len(parts) == 4:
-        day, month_str, year, time_str = parts
-        year = int(year)
+    return f"{d.day} {_MONTH_NAMES[d.month]}"
+
+def format_russian_datetime(dt: datetime) -> str:
+    """
+    Обратное к parse_russian_datetime: datetime -> "31 мая 14:00".
+    """
+    return f"{format_russian_date(dt)} {dt:%H:%M}"
+
+@lru_cache(maxsize=4096)
+def _parse_slot(date_str: str, time_str: str, default_year: int) -> datetime:
+    parts = date_str.split()
+    if len(parts) == 2:
+        day, month_str = parts
+        year = default_year
+    elif len(parts) == 3:
+        day, month_str, year = parts
     else:
         raise ValueError("Ожидается формат '31 мая 14:00'")
 
-    month = _MONTHS.get(month_str.lower())
+    month = _MONTHS.get(month_str.lower()) or _LEGACY_MONTHS.get(month_str.lower())
     if not month:
         raise ValueError(f"Непонятный месяц '{month_str}'")
 
     hour, minute = map(int, time_str.split(":"))
     return datetime(int(year), month, int(day), hour, minute)
 
+def _nearest_year(dt: datetime, today: date) -> datetime:
+    candidates = []
+    for year in (today.year - 1, today.year, today.year + 1):
+        try:
+            candidates.append(dt.replace(year=year))
+        except ValueError:   # 29 февраля
+            pass
+    return min(candidates, key=lambda c: abs(c.date() - today))
+
+def parse_russian_datetime(text: str) -> datetime:
+    """
+    Принимает "31 мая 14:00" или "31 мая 2025 14:00".
+    Без года берётся ближайшая к сегодняшнему дню такая дата:
+    в декабре "12 января" — это январь следующего года.
+    Возвращает datetime.
+    """
+    parts = text.strip().split()
+    if len(parts) not in (3, 4):
+        raise ValueError("Ожидается формат '31 мая 14:00'")
+    today = date.today()
+    dt = _parse_slot(" ".join(parts[:-1]), parts[-1], today.year)
+    return _nearest_year(dt, today) if len(parts) == 3 else dt
+
+def slot_datetime(date_str: str, time_str: str) -> datetime:
+    """
+    Переводит пару (date, time) старой записи или слота расписания ("5 мая", "14:00")
+    в datetime с текущим годом. Нужна только миграциям строк без starts_at:
+    года в этих колонках нет, поэтому новые значения так не восстанавливаются.
+    Разобранные пары кэшируются.
+    """
+    return _parse_slot(date_str.strip(), time_str.strip(), date.today().year)
+
+def parse_many(rows: Iterable[Mapping]) -> list[datetime | None]:
+    """
+    Начало сеанса для каждой строки appointments: по starts_at, если он есть,
+    иначе по (date, time). Для нераспознанных строк — None.
+    """
+    year = date.today().year
+    result = []
+    for r in rows:
+        starts_at = r.get("starts_at")
+        try:
+            if starts_at:
+                result.append(datetime.fromisoformat(starts_at))
+            else:
+                result.append(_parse_slot(r["date"].strip(), r["time"].strip(), year))
+        except (ValueError, AttributeError):
+            result.append(None)
+    return result
+
+def to_starts_at(dt: datetime) -> str:
+    """
+    Каноническое представление начала сеанса для колонки starts_at:
+    'YYYY-MM-DD HH:MM' — не зависит от локали и сортируется как строка.
+    """
+    return dt.strftime("%Y-%m-%d %H:%M")
+
+def record_button(r: dict, prefix: str = "") -> str:
+    """
+    Текст кнопки выбора записи: '#<id> [prefix ]<date> <time>'.
+    В FSM при этом хранятся только ID записей.
+    """
+    return f"#{r['id']} {prefix + ' ' if prefix else ''}{r['date']} {r['time']}"
+
+def record_id_from_button(text: str | None) -> int | None:
+    """
+    Достаёт ID записи из текста кнопки record_button.
+    """
+    m = re.match(r"#(\d+)\b", text or "")
+    return int(m.group(1)) if m else None
+
 async def send_with_main_menu(message: Message, text: str):
-    from keyboards.client_kb import main_menu
-    await message.answer(text, reply_markup=main_menu())
+    from keyboards.client_kb import client_menu
+    await message.answer(text, reply_markup=client_menu())